@@ -0,0 +1,405 @@
+import argparse
+import atexit
+import csv
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# MES: $5 per index point
+DEFAULT_POINT_VALUE = 5.0
+# Channels not in the registry are named after the source their profile had before the registry
+PROFILE_SOURCES = {"content": "discord_message", "embed": "second_channel"}
+
+@dataclass
+class SimOrder:
+    time: float
+    action: str
+    order_type: str
+    quantity: int
+    stop_price: Optional[float] = None
+    operation: str = ""
+    ticker: str = ""
+    source: str = ""
+
+@dataclass
+class BacktestResult:
+    params: Dict[str, str]
+    messages: int = 0
+    orders: int = 0
+    entries: int = 0
+    round_trips: int = 0
+    wins: int = 0
+    pnl_points: float = 0.0
+    pnl_dollars: float = 0.0
+    max_drawdown_dollars: float = 0.0
+    replay_seconds: float = 0.0
+    fill_seconds: float = 0.0
+    trades: List[Dict] = field(default_factory=list)
+
+# Stands in for order_executor: every order the handlers send is recorded at the replayed time
+class SimulatedExecutor:
+    def __init__(self, default_quantity: int):
+        self.default_quantity = default_quantity
+        self.now = 0.0
+        self.source = ""
+        self.orders: List[SimOrder] = []
+
+    def record(self, payload: Dict, quantity: Optional[int], operation_name: str):
+        if quantity is None:
+            quantity = int(payload.get("quantity", self.default_quantity))
+        stop_price = payload.get("stopPrice")
+        self.orders.append(SimOrder(
+            time=self.now,
+            action=payload.get("action", ""),
+            order_type=payload.get("orderType", "market"),
+            quantity=int(quantity),
+            stop_price=float(stop_price) if stop_price not in (None, "") else None,
+            operation=operation_name,
+            ticker=payload.get("ticker", ""),
+            source=self.source,
+        ))
+
+    def send_webhook_to_multiple_urls(self, payload, urls, operation_name="webhook", quantity=None, is_entry_trade=False, additional_context=None):
+        self.record(payload, quantity, operation_name)
+        return []
+
+    def send_cancel_and_enter(self, ticker, payload, urls, operation_name="webhook", quantity=None, is_entry_trade=False, additional_context=None):
+        self.record({"ticker": ticker, "action": "cancel"}, 0, "Cancel webhook")
+        self.record(payload, quantity, operation_name)
+        return []
+
+    def run_batched(self, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+def parse_timestamp(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def iter_messages(path: str) -> Iterator[Dict]:
+    # Exports are streamed line by line, oldest first, so months of history never sit in memory
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping malformed export line {line_number}", file=sys.stderr)
+
+def iter_archives(names: List[str]) -> Iterator[Dict]:
+    import channel_registry
+    import history_archive
+
+    readers = []
+    streams = []
+    try:
+        for name in names:
+            channel = channel_registry.get_channel(name)
+            if channel is None:
+                raise ValueError(f"Archived channel {name} is not in the channel registry")
+            reader = history_archive.ArchiveReader(name)
+            readers.append(reader)
+            streams.append(reader.messages(channel.channel_id, channel.profile))
+        # Snowflakes order messages across channels the same way they arrived live
+        yield from heapq.merge(*streams, key=lambda msg: int(msg["id"]))
+    finally:
+        for reader in readers:
+            reader.close()
+
+def apply_params(config, params: Dict[str, str]):
+    for name, value in params.items():
+        if name.startswith("LETTER_"):
+            config.LETTER_WEBHOOK_QUANTITIES[name[len("LETTER_"):]] = int(value)
+        elif hasattr(config, name):
+            setattr(config, name, type(getattr(config, name))(value))
+        else:
+            raise ValueError(f"Unknown backtest parameter {name}")
+
+def replay(messages_path: Optional[str], archives: List[str], params: Dict[str, str], channel_overrides: Dict[str, Tuple[str, str]], default_profile: Optional[str]) -> Tuple[List[SimOrder], int]:
+    # The bot's modules read STATE_DIR at import, so each replay gets throwaway state
+    # Archives stay where the real state directory keeps them
+    os.environ.setdefault("ARCHIVE_DIR", os.path.join(os.getenv("STATE_DIR", "."), "archive"))
+    state_dir = tempfile.mkdtemp(prefix="backtest-")
+    # Registered before the bot is imported so it runs after the bot's own exit flushes
+    atexit.register(shutil.rmtree, state_dir, True)
+    os.environ["STATE_DIR"] = state_dir
+    os.environ["METRICS_DUMP_INTERVAL_SECONDS"] = "0"
+    # The handlers log every signal; a sweep only wants the scores unless asked otherwise
+    os.environ["LOG_LEVEL"] = os.getenv("BACKTEST_LOG_LEVEL", "off")
+    import config
+    import channel_registry
+    import main
+    import position_tracker
+
+    apply_params(config, params)
+    executor = SimulatedExecutor(config.GLOBAL_QUANTITY)
+    main.order_executor = executor
+    position_tracker.clock = lambda: datetime.fromtimestamp(executor.now, timezone.utc).replace(tzinfo=None)
+
+    count = 0
+    channels = {channel.channel_id: (channel.name, channel.profile) for channel in channel_registry.get_channels().values()}
+    channels.update(channel_overrides)
+    for msg in iter_messages(messages_path) if messages_path else iter_archives(archives):
+        channel_id = str(msg.get("channel_id", ""))
+        name, profile = channels.get(channel_id, (None, default_profile))
+        if profile is None:
+            continue
+        timestamp = msg.get("timestamp")
+        if not timestamp:
+            continue
+        executor.now = parse_timestamp(timestamp)
+        executor.source = name or PROFILE_SOURCES[profile]
+        count += 1
+        position_tracker.reset_orders_if_expired()
+        main.PROFILE_PROCESSORS[profile](msg, source=executor.source)
+    return executor.orders, count
+
+def load_bars(path: str) -> Dict[str, "np.ndarray"]:
+    # CSV with a header: timestamp (epoch seconds or ISO 8601, UTC if naive), open, high, low, close
+    times, opens, highs, lows, closes = [], [], [], [], []
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            times.append(parse_timestamp(row["timestamp"]))
+            opens.append(float(row["open"]))
+            highs.append(float(row["high"]))
+            lows.append(float(row["low"]))
+            closes.append(float(row["close"]))
+    bars = {
+        "time": np.asarray(times, dtype=np.float64),
+        "open": np.asarray(opens, dtype=np.float64),
+        "high": np.asarray(highs, dtype=np.float64),
+        "low": np.asarray(lows, dtype=np.float64),
+        "close": np.asarray(closes, dtype=np.float64),
+    }
+    order = np.argsort(bars["time"], kind="stable")
+    return {name: values[order] for name, values in bars.items()}
+
+def simulate(orders: List[SimOrder], bars: Dict[str, "np.ndarray"], point_value: float) -> Tuple[List[Dict], "np.ndarray"]:
+    # Orders act from the first bar that opens at or after the message; market orders fill at that
+    # bar's open, stops at the stop price or the open if the bar gaps through it. Sells only reduce
+    # the long position, as the receiver never goes short on them.
+    n_bars = len(bars["time"])
+    if not orders or n_bars == 0:
+        return [], np.zeros(n_bars)
+
+    order_bars = np.searchsorted(bars["time"], np.fromiter((order.time for order in orders), dtype=np.float64, count=len(orders)), side="left")
+    fill_bars, fill_qty, fill_price = [], [], []
+    position = 0
+    working_stops: List[List] = []  # [placed bar, stop price, quantity, is_sell]
+
+    def fill(bar: int, quantity: int, price: float):
+        nonlocal position
+        position += quantity
+        fill_bars.append(bar)
+        fill_qty.append(quantity)
+        fill_price.append(price)
+
+    def trigger_stops(until: int):
+        # Each working stop finds its first crossing with one vectorized scan of the bars in between
+        while working_stops and position > 0:
+            first = None
+            for stop in working_stops:
+                start, price, _, is_sell = stop
+                if start >= until:
+                    continue
+                window = bars["low"][start:until] <= price if is_sell else bars["high"][start:until] >= price
+                hits = np.flatnonzero(window)
+                if hits.size and (first is None or start + hits[0] < first[0]):
+                    first = (start + int(hits[0]), stop)
+            if first is None:
+                return
+            bar, stop = first
+            working_stops.remove(stop)
+            _, price, quantity, is_sell = stop
+            if is_sell:
+                fill(bar, -min(quantity, position), min(price, bars["open"][bar]))
+            else:
+                fill(bar, quantity, max(price, bars["open"][bar]))
+        if position <= 0:
+            working_stops.clear()
+
+    for order, bar in zip(orders, order_bars.tolist()):
+        trigger_stops(min(bar, n_bars))
+        if bar >= n_bars:
+            break
+        if order.action == "cancel":
+            working_stops.clear()
+        elif order.action == "exit":
+            working_stops.clear()
+            if position > 0:
+                fill(bar, -position, bars["open"][bar])
+        elif order.order_type == "stop" and order.stop_price is not None:
+            working_stops.append([bar, order.stop_price, order.quantity, order.action != "buy"])
+        elif order.action == "buy" and order.quantity > 0:
+            fill(bar, order.quantity, bars["open"][bar])
+        elif order.action == "sell" and position > 0:
+            fill(bar, -min(order.quantity, position), bars["open"][bar])
+    trigger_stops(n_bars)
+
+    # Mark to market on every bar close: cash and position change only where fills happen
+    qty = np.asarray(fill_qty, dtype=np.float64)
+    price = np.asarray(fill_price, dtype=np.float64)
+    positions = np.cumsum(np.bincount(fill_bars, weights=qty, minlength=n_bars))
+    cash = np.cumsum(np.bincount(fill_bars, weights=-qty * price, minlength=n_bars))
+    equity = (cash + positions * bars["close"]) * point_value
+
+    trades = []
+    open_trade = None
+    running = 0
+    for bar, quantity, fill_at in zip(fill_bars, fill_qty, fill_price):
+        if running == 0 and quantity > 0:
+            open_trade = {"entry_time": float(bars["time"][bar]), "entry_price": fill_at, "quantity": 0, "pnl_points": 0.0}
+        running += quantity
+        open_trade["quantity"] = max(open_trade["quantity"], running)
+        open_trade["pnl_points"] -= quantity * fill_at
+        if running == 0:
+            open_trade["exit_time"] = float(bars["time"][bar])
+            trades.append(open_trade)
+            open_trade = None
+    if open_trade is not None:
+        open_trade["pnl_points"] += running * float(bars["close"][-1])
+        open_trade["exit_time"] = None
+        trades.append(open_trade)
+    return trades, equity
+
+def run_backtest(messages_path: Optional[str], archives: List[str], bars_path: str, params: Dict[str, str], channel_overrides: Dict[str, Tuple[str, str]], default_profile: Optional[str], point_value: float, ticker: Optional[str] = None) -> BacktestResult:
+    result = BacktestResult(params=params)
+    started = time.perf_counter()
+    orders, result.messages = replay(messages_path, archives, params, channel_overrides, default_profile)
+    result.replay_seconds = time.perf_counter() - started
+
+    # The bars are one instrument's; every channel is still replayed so books interact as they do live
+    if ticker:
+        orders = [order for order in orders if order.ticker == ticker]
+    tickers = sorted({order.ticker for order in orders})
+    if len(tickers) > 1:
+        raise ValueError(f"Orders span several tickers ({', '.join(tickers)}) but the bars are one series; pick one with --ticker")
+
+    started = time.perf_counter()
+    bars = load_bars(bars_path)
+    trades, equity = simulate(orders, bars, point_value)
+    result.fill_seconds = time.perf_counter() - started
+
+    result.orders = len(orders)
+    result.entries = sum(1 for order in orders if order.action == "buy")
+    result.trades = trades
+    result.round_trips = sum(1 for trade in trades if trade["exit_time"] is not None)
+    result.wins = sum(1 for trade in trades if trade["exit_time"] is not None and trade["pnl_points"] > 0)
+    if equity.size:
+        result.pnl_points = float(equity[-1] / point_value)
+        result.pnl_dollars = float(equity[-1])
+        result.max_drawdown_dollars = float(np.max(np.maximum.accumulate(equity) - equity))
+    return result
+
+def parse_assignments(values: List[str]) -> Dict[str, List[str]]:
+    assignments = {}
+    for value in values:
+        name, _, options = value.partition("=")
+        if not name or not options:
+            raise ValueError(f"Expected NAME=VALUE[,VALUE...], got '{value}'")
+        assignments[name] = options.split(",")
+    return assignments
+
+def parse_channels(values: List[str]) -> Dict[str, Tuple[str, str]]:
+    channels = {}
+    for value in values:
+        channel_id, _, spec = value.partition("=")
+        profile, _, name = spec.partition(":")
+        if profile not in PROFILE_SOURCES:
+            raise ValueError(f"Channel {channel_id} needs a profile of {', '.join(PROFILE_SOURCES)}, got '{profile}'")
+        channels[channel_id] = (name or PROFILE_SOURCES[profile], profile)
+    return channels
+
+def print_results(results: List[BacktestResult]):
+    names = sorted({name for result in results for name in result.params})
+    header = names + ["entries", "trips", "win%", "pnl pts", "pnl $", "max dd $", "replay s", "fills s"]
+    rows = []
+    for result in results:
+        win_rate = 100.0 * result.wins / result.round_trips if result.round_trips else 0.0
+        rows.append([result.params.get(name, "") for name in names] + [
+            str(result.entries), str(result.round_trips), f"{win_rate:.0f}", f"{result.pnl_points:.2f}",
+            f"{result.pnl_dollars:.2f}", f"{result.max_drawdown_dollars:.2f}", f"{result.replay_seconds:.2f}", f"{result.fill_seconds:.3f}",
+        ])
+    widths = [max(len(header[i]), *(len(row[i]) for row in rows)) for i in range(len(header))]
+    print("  ".join(title.rjust(width) for title, width in zip(header, widths)))
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a Discord channel export through the bot's parsers and handlers and score the orders against minute bars")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--messages", help="JSONL export, one Discord message object per line, oldest first")
+    source.add_argument("--archive", action="append", metavar="CHANNEL", help="replay a registry channel's history archive instead; repeat to merge channels")
+    parser.add_argument("--bars", required=True, help="CSV of bars with timestamp, open, high, low, close columns")
+    parser.add_argument("--channel", action="append", default=[], metavar="ID=PROFILE[:NAME]", help="profile (content or embed) and optional source name for a channel id not in the channel registry")
+    parser.add_argument("--default-profile", choices=tuple(PROFILE_SOURCES), help="profile for messages from channels that are not mapped")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="override a config rule, e.g. MIN_SIGNAL_SCORE=6, STOP_OFFSET_POINTS=2.5, LETTER_B=5")
+    parser.add_argument("--sweep", action="append", default=[], metavar="NAME=V1,V2,...", help="run every combination of these rule values")
+    parser.add_argument("--ticker", help="score only this ticker's orders against the bars; required when the replayed channels trade several")
+    parser.add_argument("--point-value", type=float, default=DEFAULT_POINT_VALUE, help="dollars per index point per contract")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes used for sweeps")
+    parser.add_argument("--json", action="store_true", help="print results, including trades, as JSON")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("The backtest needs numpy: pip install numpy", file=sys.stderr)
+        return 1
+
+    try:
+        fixed = {name: values[-1] for name, values in parse_assignments(args.set).items()}
+        sweep = parse_assignments(args.sweep)
+        channel_overrides = parse_channels(args.channel)
+    except ValueError as e:
+        parser.error(str(e))
+
+    names = list(sweep)
+    combinations = [{**fixed, **dict(zip(names, values))} for values in itertools.product(*(sweep[name] for name in names))]
+    run_args = (args.messages, args.archive or [], args.bars)
+    run_rest = (channel_overrides, args.default_profile, args.point_value, args.ticker)
+
+    started = time.perf_counter()
+    try:
+        if len(combinations) == 1:
+            results = [run_backtest(*run_args, combinations[0], *run_rest)]
+        else:
+            # Every combination gets a fresh process: the bot keeps its position book and dedupe
+            # stores in module state, so runs must not share an interpreter
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(args.workers, len(combinations)), mp_context=context, max_tasks_per_child=1) as pool:
+                results = list(pool.map(run_backtest, *zip(*[(*run_args, params, *run_rest) for params in combinations])))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps([asdict(result) for result in results], indent=2))
+    else:
+        print_results(results)
+        print(f"{len(results)} run(s), {results[0].messages} messages each, in {elapsed:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+CONTENT_MESSAGES = [
+    "@everyone ES long 5012: A\nStop: 4998",
+    "@everyone ES long 5012: A swing\nStop: 4998",
+    "@everyone ES short 5040: B\nStop: 5m close 5052",
+    "@everyone ES long 4987: C scalp\nPlan is to hold above 4990\nStop: 4979",
+    "@everyone ES long 5001: roll\nStop: 4991",
+    "@everyone ES long 5001: roll w/ profits\nStop: 4991",
+    "@everyone ES short 5063: D\nStop: 5071",
+    "@everyone #alert trim 1/8",
+    "@everyone #alert trim 1/2",
+    "@everyone #alert trim 3/4",
+    "@everyone #alert trim 1/1",
+    "@everyone #alert stopped",
+    "@everyone #Alert Stopped - flat here",
+    "Watching 5010 for a reclaim, no position yet",
+    "ES long bias above 5000 today, waiting for a setup",
+    "Good morning everyone, CPI at 8:30",
+    "Lunch chop, sitting on hands",
+    "Trimmed some earlier, see #alert above",
+    "",
+]
+
+EMBED_MESSAGES = [
+    "**Long Triggered**\nTicker: **MES1!**\nInterval: **5**\nLevel: **5012.25**\nScore: **6/7**\nPrice: **5013.50**\nTime: **2025-03-04 10:31:00**",
+    "**Long Triggered**\nTicker: **MES1!**\nInterval: **15**\nLevel: **4988.75**\nScore: **3/7**\nPrice: **4990.00**\nTime: **2025-03-04 13:02:00**",
+    "**Target 1 Hit**\nTicker: **MES1!**\nInterval: **5**\nLevel: **5012.25**\nTarget 1: **5020.00**\nEntry: **5013.50**\nProfit: **+6.50 pts**\nTime: **2025-03-04 10:45:00**",
+    "**Target 2 Hit**\nTicker: **MES1!**\nInterval: **5**\nLevel: **5012.25**\nTarget 2: **5028.00**\nEntry: **5013.50**\nProfit: **+14.50 pts**\nTime: **2025-03-04 11:20:00**",
+    "Stop Loss Hit\nTicker: **MES1!**\nInterval: **5**\nLevel: **5012.25**\nEntry: **5013.50**\nExit: **5009.25**\nLoss: **-4.25 pts**\nTime: **2025-03-04 10:39:00**",
+    "**Stop Loss**\nTicker: **MES1!**\nInterval: **15**\nLevel: **4988.75**\nEntry: **4990.00**\nExit: **4986.00**\nLoss: **-4.00 pts**",
+    "#alert stopped",
+    "**Short Triggered**\nTicker: **MES1!**\nInterval: **5**\nLevel: **5040.00**\nPrice: **5039.25**",
+    "Session summary: 3 triggers, 2 targets, 1 stop",
+    "",
+]
@@ -0,0 +1,91 @@
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import backtest
+from benchmarks.stand_ins import make_message
+
+CONTENT_CHANNEL_ID = "1000"
+EMBED_CHANNEL_ID = "2000"
+SESSION_START = 14 * 3600 + 30 * 60
+SESSION_MINUTES = 390
+
+def write_history(directory: str, days: int, noise_per_signal: int, seed: int):
+    # A random-walk minute series with a few content and embed signal cycles per session, so the
+    # replayed orders land on bars that can both reach and miss their stops
+    rng = random.Random(seed)
+    bars_path = os.path.join(directory, "bars.csv")
+    messages_path = os.path.join(directory, "messages.jsonl")
+    start = datetime(2025, 1, 6, tzinfo=timezone.utc).timestamp()
+    price = 5000.0
+    sequence = 0
+    with open(bars_path, 'w', newline='') as bars_file, open(messages_path, 'w') as messages_file:
+        bars = csv.writer(bars_file)
+        bars.writerow(["timestamp", "open", "high", "low", "close"])
+
+        def post(at: float, channel_id: str, **fields):
+            nonlocal sequence
+            sequence += 1
+            message = make_message(at, sequence, **fields)
+            message["channel_id"] = channel_id
+            messages_file.write(json.dumps(message) + "\n")
+
+        for day in range(days):
+            session = start + day * 86400 + SESSION_START
+            signal_minutes = set(range(15, SESSION_MINUTES - 60, 45))
+            for minute in range(SESSION_MINUTES):
+                at = session + minute * 60
+                open_price = price
+                path = [open_price + rng.gauss(0, 1.5) for _ in range(4)]
+                price = round(path[-1] * 4) / 4
+                bars.writerow([int(at), open_price, max(open_price, *path), min(open_price, *path), price])
+
+                if minute not in signal_minutes:
+                    continue
+                for index in range(noise_per_signal):
+                    post(at + index, CONTENT_CHANNEL_ID, content="Lunch chop, sitting on hands")
+                level = round(price)
+                if (minute // 45) % 2:
+                    time_str = datetime.fromtimestamp(at, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+                    post(at + 30, EMBED_CHANNEL_ID, embed=f"**Long Triggered**\nTicker: **MES1!**\nInterval: **5**\nLevel: **{level - 1}**\nScore: **{rng.randint(3, 7)}/7**\nPrice: **{level}**\nTime: **{time_str}**")
+                    post(at + 30 + 60 * rng.randint(5, 20), EMBED_CHANNEL_ID, embed=f"**Target 1 Hit**\nTicker: **MES1!**\nInterval: **5**\nLevel: **{level - 1}**\nTarget 1: **{level + 6}**\nEntry: **{level}**\nProfit: **+6.00 pts**\nTime: **{time_str}**")
+                else:
+                    letter = rng.choice("ABC")
+                    post(at + 30, CONTENT_CHANNEL_ID, content=f"@everyone ES long {level}: {letter}\nStop: {level - 8}", mention_everyone=True)
+                    post(at + 30 + 60 * rng.randint(5, 15), CONTENT_CHANNEL_ID, content="@everyone #alert trim 1/2", mention_everyone=True)
+                    post(at + 30 + 60 * rng.randint(16, 30), CONTENT_CHANNEL_ID, content="@everyone #alert stopped", mention_everyone=True)
+    return messages_path, bars_path
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time the backtest over generated months of alerts and minute bars")
+    parser.add_argument("--days", type=int, default=63, help="trading sessions of history to generate")
+    parser.add_argument("--noise-per-signal", type=int, default=4, help="chat messages posted before each signal")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="backtest-bench-")
+    try:
+        started = time.perf_counter()
+        messages_path, bars_path = write_history(directory, args.days, args.noise_per_signal, args.seed)
+        print(f"generated {args.days} sessions in {time.perf_counter() - started:.2f}s")
+        return backtest.main([
+            "--messages", messages_path,
+            "--bars", bars_path,
+            "--channel", f"{CONTENT_CHANNEL_ID}=content",
+            "--channel", f"{EMBED_CHANNEL_ID}=embed",
+            "--sweep", "MIN_SIGNAL_SCORE=4,5,6",
+            "--sweep", "STOP_OFFSET_POINTS=2,3,4",
+            "--workers", str(args.workers),
+        ])
+    finally:
+        shutil.rmtree(directory, True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import sys
+import time
+import message_parser
+from benchmarks.alert_corpus import CONTENT_MESSAGES, EMBED_MESSAGES
+
+def legacy_classify_content(content):
+    for signal_type, parse in (
+        (message_parser.SIGNAL_STOPPED, message_parser.parse_stopped_message),
+        (message_parser.SIGNAL_TRIM, message_parser.parse_trim_message),
+        (message_parser.SIGNAL_ES_ORDER, message_parser.parse_es_order_message),
+    ):
+        match = parse(content)
+        if match:
+            return signal_type, match
+    return None, None
+
+def legacy_classify_embed(content):
+    for signal_type, parse in (
+        (message_parser.SIGNAL_STOPPED, message_parser.parse_stopped_message),
+        (message_parser.SIGNAL_TARGET_HIT, message_parser.parse_target_hit_message),
+        (message_parser.SIGNAL_TARGET2_HIT, message_parser.parse_target2_hit_message),
+        (message_parser.SIGNAL_STOP_LOSS, message_parser.parse_stop_loss_message),
+        (message_parser.SIGNAL_STOP_LOSS_SIMPLE, message_parser.parse_stop_loss_simple_message),
+        (message_parser.SIGNAL_LONG_TRIGGERED, message_parser.parse_long_triggered_message),
+    ):
+        match = parse(content)
+        if match and (signal_type != message_parser.SIGNAL_STOP_LOSS_SIMPLE or "Loss:" in content):
+            return signal_type, match
+    return None, None
+
+def check_equivalence(messages, legacy, classify) -> int:
+    mismatches = 0
+    for content in messages:
+        legacy_type, legacy_match = legacy(content)
+        signal_type, match = classify(content)
+        legacy_groups = legacy_match.groups() if legacy_match else None
+        groups = match.groups() if match else None
+        if legacy_type != signal_type or legacy_groups != groups:
+            mismatches += 1
+            print(f"MISMATCH: {content!r}\n  legacy={legacy_type} {legacy_groups}\n  classifier={signal_type} {groups}")
+    return mismatches
+
+def time_per_message(messages, classify, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for content in messages:
+            classify(content)
+    return (time.perf_counter() - started) / (rounds * len(messages))
+
+def main(rounds: int = 20000):
+    mismatches = check_equivalence(CONTENT_MESSAGES, legacy_classify_content, message_parser.classify_content_message)
+    mismatches += check_equivalence(EMBED_MESSAGES, legacy_classify_embed, message_parser.classify_embed_message)
+    
+    for name, messages, legacy, classify in (
+        ("content", CONTENT_MESSAGES, legacy_classify_content, message_parser.classify_content_message),
+        ("embed", EMBED_MESSAGES, legacy_classify_embed, message_parser.classify_embed_message),
+    ):
+        legacy_time = time_per_message(messages, legacy, rounds)
+        classifier_time = time_per_message(messages, classify, rounds)
+        print(f"{name:8s} legacy={legacy_time * 1e6:7.2f}us/msg  classifier={classifier_time * 1e6:7.2f}us/msg  speedup={legacy_time / classifier_time:5.2f}x")
+    
+    print(f"Match group mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
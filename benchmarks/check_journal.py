@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+state_dir = tempfile.mkdtemp(prefix="journal-check-")
+os.environ["STATE_DIR"] = state_dir
+os.environ.setdefault("LOG_LEVEL", "error")
+
+import config
+import order_journal
+import position_tracker
+
+failures = 0
+
+def check(name: str, actual, expected):
+    global failures
+    if actual == expected:
+        print(f"ok    {name}")
+    else:
+        failures += 1
+        print(f"FAIL  {name}\n  expected={expected!r}\n  actual=  {actual!r}")
+
+def reset(name: str):
+    # Each scenario starts from an unloaded process state over its own directory
+    directory = os.path.join(state_dir, name)
+    os.makedirs(directory)
+    config.JOURNAL_DIR = os.path.join(directory, "journal")
+    config.ORDER_FILE = os.path.join(directory, "open_order.json")
+    restart()
+
+def restart():
+    if order_journal.journal_file is not None:
+        order_journal.journal_file.close()
+    order_journal.journal_file = None
+    order_journal.segment_index = 0
+    order_journal.sequence = 0
+    order_journal.positions = {}
+    order_journal.recovered = False
+    position_tracker.open_orders = {}
+    position_tracker.loaded = False
+
+def write_segment(index: int, lines):
+    os.makedirs(config.JOURNAL_DIR, exist_ok=True)
+    with open(order_journal.segment_path(index), 'w') as f:
+        f.write("".join(lines))
+
+def record(seq: int, event_type: str, **data) -> str:
+    return json.dumps({"seq": seq, "ts": "2026-01-05T10:00:00", "type": event_type, **data}) + "\n"
+
+def position(ticker: str, source: str, quantity: int):
+    return {"timestamp": position_tracker.clock().isoformat(), "order_info": {"ticker": ticker, "source": source, "action": "buy", "quantities": {"personal": quantity, "webhook": quantity}}}
+
+def book():
+    position_tracker.load_open_orders()
+    return {key: order_data["order_info"]["quantities"]["webhook"] for key, order_data in position_tracker.open_orders.items()}
+
+def check_replay():
+    reset("replay")
+    # Unkeyed records come from the single-position era: the close empties the book, the next entry reopens it
+    write_segment(1, [
+        record(1, "entry", position=position("MES", "discord_message", 3)),
+        record(2, "stop"),
+        record(3, "entry", position=position("MES", "discord_message", 5)),
+        record(4, "webhook_ack", url="http://receiver", payload={}),
+    ])
+    write_segment(2, [
+        record(5, "entry", key="MNQ|second_channel|default", position=position("MNQ", "second_channel", 8)),
+        record(6, "trim", key="MNQ|second_channel|default", position=position("MNQ", "second_channel", 4)),
+        record(7, "entry", key="MYM|third|default", position=position("MYM", "third", 2)),
+        record(8, "exit", key="MYM|third|default"),
+        # Torn by a crash mid-append: the exit it held never happened
+        record(9, "exit", key="MNQ|second_channel|default")[:40],
+    ])
+    expected = {("MES", "discord_message", "default"): 5, ("MNQ", "second_channel", "default"): 4}
+    check("replay keyed and legacy records, skipping the torn line", book(), expected)
+    check("replay compacts several segments into one", order_journal.list_segments(), [3])
+
+    position_tracker.clear_open_order(("MES", "discord_message", "default"))
+    restart()
+    check("append after recovery survives the next restart", book(), {("MNQ", "second_channel", "default"): 4})
+
+def check_torn_tail():
+    reset("torn")
+    write_segment(1, [
+        record(1, "entry", key="MES|a|default", position=position("MES", "a", 3)),
+        record(2, "exit", key="MES|a|default")[:30],
+    ])
+    check("single segment with a torn tail", book(), {("MES", "a", "default"): 3})
+    # The next record must not be glued onto the torn bytes
+    position_tracker.save_open_order(position("MES", "a", 1)["order_info"], "trim")
+    restart()
+    check("record appended after a torn tail is replayed", book(), {("MES", "a", "default"): 1})
+
+def check_legacy_file():
+    reset("legacy")
+    with open(config.ORDER_FILE, 'w') as f:
+        json.dump(position("MES", "discord_message", 5), f)
+    check("unkeyed order file migrates into the book", book(), {("MES", "discord_message", "default"): 5})
+    check("migration writes a journal snapshot", order_journal.has_journal(), True)
+    os.remove(config.ORDER_FILE)
+    restart()
+    check("migrated book replays from the journal alone", book(), {("MES", "discord_message", "default"): 5})
+
+def check_compaction():
+    reset("compaction")
+    max_bytes = config.JOURNAL_SEGMENT_MAX_BYTES
+    config.JOURNAL_SEGMENT_MAX_BYTES = 2048
+    try:
+        for index in range(60):
+            position_tracker.save_open_order(position("MES", f"source-{index % 4}", index)["order_info"], "entry")
+            if index % 3 == 0:
+                position_tracker.clear_open_order(("MES", f"source-{(index + 1) % 4}", "default"))
+        expected = book()
+        check("size-triggered compaction keeps one segment", len(order_journal.list_segments()), 1)
+        restart()
+        check("compacted journal replays to the same book", book(), expected)
+    finally:
+        config.JOURNAL_SEGMENT_MAX_BYTES = max_bytes
+
+def main() -> int:
+    try:
+        check_replay()
+        check_torn_tail()
+        check_legacy_file()
+        check_compaction()
+    finally:
+        restart()
+        shutil.rmtree(state_dir, ignore_errors=True)
+    print(f"Journal check failures: {failures}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
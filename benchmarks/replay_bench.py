@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+from benchmarks.alert_corpus import CONTENT_MESSAGES
+from benchmarks.stand_ins import FakeDiscordServer, FakeGatewayServer, WebhookSink, make_message
+
+CONTENT_CHANNEL_ID = "1000"
+EMBED_CHANNEL_ID = "2000"
+
+ENTRY = "@everyone ES long {price}: A\nStop: {stop}"
+TRIM = "@everyone #alert trim 1/2"
+STOPPED = "@everyone #alert stopped"
+LONG_TRIGGERED = "**Long Triggered**\nTicker: **MES1!**\nInterval: **5**\nLevel: **{level}**\nScore: **6/7**\nPrice: **{price}**\nTime: **{time}**"
+TARGET2_HIT = "**Target 2 Hit**\nTicker: **MES1!**\nInterval: **5**\nLevel: **{level}**\nTarget 2: **{target}**\nEntry: **{price}**\nProfit: **+12.00 pts**\nTime: **{time}**"
+
+# (channel, release offset, message, expected webhook action or None for noise)
+TimelineEntry = Tuple[str, float, Dict, str]
+
+def build_timeline(start: float, cycles: int, gap: float, noise_burst: int, channels: int) -> List[TimelineEntry]:
+    timeline = []
+    offset = 1.0
+    sequence = 0
+
+    def add(channel_id, expected, **message_fields):
+        nonlocal sequence
+        sequence += 1
+        message = make_message(start + offset, sequence, **message_fields)
+        timeline.append((channel_id, offset, message, expected))
+
+    for cycle in range(cycles):
+        price = 5000 + cycle
+        # Noise lands in the same poll window as the signal that follows it
+        for index in range(noise_burst):
+            add(CONTENT_CHANNEL_ID, None, content=CONTENT_MESSAGES[-2 - index % 4])
+
+        if channels == 2 and cycle % 2:
+            time_str = f"2025-03-04 10:{cycle % 60:02d}:00"
+            add(EMBED_CHANNEL_ID, "buy", embed=LONG_TRIGGERED.format(level=price - 1, price=price, time=time_str))
+            offset += gap
+            add(EMBED_CHANNEL_ID, "exit", embed=TARGET2_HIT.format(level=price - 1, target=price + 12, price=price, time=time_str))
+            offset += gap
+            continue
+
+        add(CONTENT_CHANNEL_ID, "buy", content=ENTRY.format(price=price, stop=price - 10), mention_everyone=True)
+        offset += gap
+        add(CONTENT_CHANNEL_ID, "sell", content=TRIM, mention_everyone=True)
+        offset += gap
+        add(CONTENT_CHANNEL_ID, "exit", content=STOPPED, mention_everyone=True)
+        offset += gap
+
+    return timeline
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def match_webhooks(timeline: List[TimelineEntry], start: float, received: List[Dict]) -> Tuple[List[float], int]:
+    expected = [(start + offset, action) for _, offset, _, action in timeline if action]
+    matched = [False] * len(expected)
+    latencies = []
+    for webhook in sorted(received, key=lambda item: item["received_at"]):
+        action = webhook["payload"].get("action")
+        for index, (released_at, expected_action) in enumerate(expected):
+            if not matched[index] and expected_action == action and released_at <= webhook["received_at"]:
+                matched[index] = True
+                latencies.append(webhook["received_at"] - released_at)
+                break
+    return latencies, matched.count(False)
+
+def publish_timeline(gateway: FakeGatewayServer, timeline: List[TimelineEntry], start: float, drop_every: int):
+    for index, (channel_id, offset, message, _) in enumerate(sorted(timeline, key=lambda entry: entry[1])):
+        time.sleep(max(0.0, start + offset - time.time()))
+        gateway.publish(channel_id, message)
+        if drop_every and (index + 1) % drop_every == 0:
+            gateway.drop_connections()
+
+def write_channels_file(path: str, channels: int, idle_rooms: int):
+    entries = [{"name": "discord_message", "token_env": "DISCORD_TOKEN", "channel_id": CONTENT_CHANNEL_ID, "profile": "content"}]
+    if channels == 2:
+        entries.append({"name": "second_channel", "token_env": "DISCORD_TOKEN_2", "channel_id": EMBED_CHANNEL_ID, "profile": "embed"})
+    for index in range(idle_rooms):
+        entries.append({"name": f"idle_{index}", "token": f"bench-idle-{index}", "channel_id": str(3000 + index), "profile": "content"})
+    with open(path, 'w') as f:
+        json.dump({"channels": entries}, f)
+
+def configure_environment(discord: FakeDiscordServer, sink: WebhookSink, state_dir: str, channels: int, poll_interval: float, gateway_url: str = "", idle_rooms: int = 0):
+    channels_file = os.path.join(state_dir, "channels.json")
+    if idle_rooms:
+        write_channels_file(channels_file, channels, idle_rooms)
+    os.environ.update({
+        "CHANNELS_FILE": channels_file,
+        "INGESTION_MODE": "gateway" if gateway_url else "rest",
+        "DISCORD_GATEWAY_URL": gateway_url,
+        "DISCORD_API_BASE": discord.base_url,
+        "DISCORD_TOKEN": "bench-token",
+        "DISCORD_CHANNEL_ID": CONTENT_CHANNEL_ID,
+        "DISCORD_TOKEN_2": "bench-token-2" if channels == 2 else "",
+        "DISCORD_CHANNEL_ID_2": EMBED_CHANNEL_ID if channels == 2 else "",
+        "WEBHOOK_URL": sink.url,
+        "STATE_DIR": state_dir,
+        "POLL_INTERVAL_SECONDS": str(poll_interval),
+        "POLL_INTERVAL_FAST_SECONDS": str(poll_interval),
+        "POLL_INTERVAL_SLOW_SECONDS": str(poll_interval),
+        "METRICS_PORT": "0",
+        "METRICS_DUMP_INTERVAL_SECONDS": "0",
+        # The replay runs whenever the benchmark is invoked, not only on trading days
+        "SESSION_ALWAYS_OPEN": "true",
+    })
+
+async def run_bot(duration: float):
+    import main
+    try:
+        await asyncio.wait_for(main.run_bot(), duration)
+    except asyncio.TimeoutError:
+        pass
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay scripted Discord timelines through the real polling loop")
+    parser.add_argument("--cycles", type=int, default=6, help="entry/exit cycles to replay")
+    parser.add_argument("--gap", type=float, default=1.5, help="seconds between signals")
+    parser.add_argument("--noise-burst", type=int, default=2, help="chat messages posted before each cycle")
+    parser.add_argument("--channels", type=int, choices=(1, 2), default=2)
+    parser.add_argument("--idle-rooms", type=int, default=0, help="extra silent channels to poll alongside the scripted ones")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--webhook-latency", type=float, default=0.0, help="seconds the webhook sink waits before answering")
+    parser.add_argument("--webhook-error-rate", type=float, default=0.0, help="fraction of webhook posts answered with 503")
+    parser.add_argument("--pipeline-cancel", action="store_true", help="send entry cancels and entries concurrently with sequence numbers")
+    parser.add_argument("--webhook-batch", choices=("off", "on"), default="off", help="send each signal's orders to the sink as one envelope")
+    parser.add_argument("--ingestion", choices=("rest", "gateway"), default="rest", help="poll REST or receive gateway pushes")
+    parser.add_argument("--gateway-drop-every", type=int, default=0, help="drop the gateway connection after every N published messages")
+    parser.add_argument("--workers", type=int, default=1, help="shard the channels across this many worker processes")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's own output")
+    args = parser.parse_args(argv)
+
+    discord = FakeDiscordServer().start()
+    sink = WebhookSink(args.webhook_latency, args.webhook_error_rate, accept_batches=args.webhook_batch == "on").start()
+    state_dir = tempfile.mkdtemp(prefix="replay-bench-")
+    # Registered before the bot is imported so it runs after the bot's own exit flushes
+    atexit.register(shutil.rmtree, state_dir, True)
+    os.environ["WEBHOOK_PIPELINE_CANCEL"] = "true" if args.pipeline_cancel else "false"
+    os.environ["WORKER_PROCESSES"] = str(args.workers)
+    os.environ["WEBHOOK_BATCH_URLS"] = sink.url if args.webhook_batch == "on" else ""
+    gateway = FakeGatewayServer().start() if args.ingestion == "gateway" else None
+    configure_environment(discord, sink, state_dir, args.channels, args.poll_interval, gateway.url if gateway else "", args.idle_rooms)
+
+    start = time.time()
+    timeline = build_timeline(start, args.cycles, args.gap, args.noise_burst, args.channels)
+    for channel_id, offset, message, _ in timeline:
+        discord.add_message(channel_id, message, start + offset)
+    duration = max(offset for _, offset, _, _ in timeline) + 3 * args.poll_interval + 2.0
+    if gateway:
+        threading.Thread(target=publish_timeline, args=(gateway, timeline, start, args.gateway_drop_every), daemon=True).start()
+
+    if not args.verbose:
+        # The bot's log lines keep their production cost but are written to the state dir
+        os.environ["LOG_FILE"] = os.path.join(state_dir, "bot.log")
+    asyncio.run(run_bot(duration))
+    elapsed = time.time() - start
+
+    latencies, missed = match_webhooks(timeline, start, sink.received)
+    signals = sum(1 for *_, action in timeline if action)
+    print(f"messages replayed:   {len(timeline)} ({signals} signals) over {elapsed:.1f}s")
+    print(f"discord requests:    {discord.requests}")
+    print(f"webhooks received:   {len(sink.received)} in {sink.requests} request(s) ({sink.failed} answered 503)")
+    print(f"signals/sec handled: {len(latencies) / elapsed:.2f}")
+    print(f"end-to-end latency:  p50={percentile(latencies, 0.5) * 1000:.1f}ms  p99={percentile(latencies, 0.99) * 1000:.1f}ms")
+    print(f"missed signals:      {missed}")
+    import latency_metrics
+    ticks = {}
+    for (metric, labels), value in latency_metrics.counters.items():
+        if metric == "poll_ticks_total":
+            outcome = dict(labels)["outcome"]
+            ticks[outcome] = ticks.get(outcome, 0) + value
+        elif metric == "poll_ticks_skipped_total":
+            ticks["skipped"] = ticks.get("skipped", 0) + value
+    # With --workers the tick counters live in the shard processes (metrics-shard-N.prom)
+    if args.workers <= 1:
+        print(f"poll ticks:          {ticks.get('on_time', 0):g} on time, {ticks.get('overrun', 0):g} overrun, {ticks.get('skipped', 0):g} skipped")
+    if gateway:
+        print(f"gateway sessions:    {gateway.identifies} identify, {gateway.resumes} resume")
+
+    discord.stop()
+    sink.stop()
+    return 1 if missed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
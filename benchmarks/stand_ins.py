@@ -0,0 +1,255 @@
+import asyncio
+import http.server
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+DISCORD_EPOCH_MS = 1420070400000
+
+def make_snowflake(released_at: float, sequence: int) -> str:
+    return str(((int(released_at * 1000) - DISCORD_EPOCH_MS) << 22) + (sequence & 0xFFF))
+
+def make_message(released_at: float, sequence: int, content: str = "", embed: Optional[str] = None, mention_everyone: bool = False) -> Dict:
+    return {
+        "id": make_snowflake(released_at, sequence),
+        "content": content,
+        "mention_everyone": mention_everyone,
+        "embeds": [{"description": embed}] if embed is not None else [],
+        "timestamp": datetime.fromtimestamp(released_at, timezone.utc).isoformat(),
+        "edited_timestamp": None,
+    }
+
+class QuietHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Buffer the response and disable Nagle so header and body go out in one segment
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def send_json(self, status: int, body, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+# Serves scripted channel timelines on /api/<version>/channels/<id>/messages. A message only
+# becomes visible once its release time has passed; limit/after/before behave like Discord's.
+class FakeDiscordServer:
+    def __init__(self):
+        self.channels: Dict[str, List[Dict]] = {}
+        self.release_times: Dict[str, float] = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self.make_handler())
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/api"
+
+    def add_message(self, channel_id: str, message: Dict, released_at: float):
+        with self.lock:
+            self.channels.setdefault(channel_id, []).append(message)
+            self.release_times[message["id"]] = released_at
+
+    def visible_messages(self, channel_id: str) -> List[Dict]:
+        now = time.time()
+        with self.lock:
+            self.requests += 1
+            messages = [m for m in self.channels.get(channel_id, []) if self.release_times[m["id"]] <= now]
+        return sorted(messages, key=lambda m: int(m["id"]), reverse=True)
+
+    def make_handler(self):
+        fake = self
+
+        class Handler(QuietHandler):
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                segments = parts.path.strip("/").split("/")
+                if len(segments) != 5 or segments[2] != "channels" or segments[4] != "messages":
+                    self.send_json(404, {"message": "Unknown route"})
+                    return
+
+                query = dict(parse_qsl(parts.query))
+                limit = min(int(query.get("limit", 50)), 100)
+                messages = fake.visible_messages(segments[3])
+                if "after" in query:
+                    after = int(query["after"])
+                    messages = [m for m in messages if int(m["id"]) > after][-limit:]
+                elif "before" in query:
+                    before = int(query["before"])
+                    messages = [m for m in messages if int(m["id"]) < before][:limit]
+                else:
+                    messages = messages[:limit]
+                self.send_json(200, messages, {"X-RateLimit-Remaining": "4", "X-RateLimit-Reset-After": "1.0"})
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-discord", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+# Accepts webhook posts, optionally slow or failing, and records when each one arrived. With
+# accept_batches it unpacks {"batch": [...]} envelopes and answers with per-item results.
+class WebhookSink:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 7, accept_batches: bool = False):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.accept_batches = accept_batches
+        self.requests = 0
+        self.random = random.Random(seed)
+        self.received: List[Dict] = []
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self.make_handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/webhook"
+
+    def make_handler(self):
+        sink = self
+
+        class Handler(QuietHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if sink.latency:
+                    time.sleep(sink.latency)
+                if sink.accept_batches and "batch" in payload:
+                    self.handle_batch(payload["batch"])
+                    return
+                with sink.lock:
+                    sink.requests += 1
+                    fail = sink.random.random() < sink.error_rate
+                    if fail:
+                        sink.failed += 1
+                    else:
+                        sink.received.append({"received_at": time.time(), "path": self.path, "payload": payload})
+                if fail:
+                    self.send_json(503, {"status": "unavailable"})
+                else:
+                    self.send_json(200, {"status": "ok"})
+
+            def handle_batch(self, items):
+                results = []
+                with sink.lock:
+                    sink.requests += 1
+                    received_at = time.time()
+                    for item in items:
+                        if sink.random.random() < sink.error_rate:
+                            sink.failed += 1
+                            results.append({"id": item.get("id"), "status": 503, "error": "unavailable"})
+                        else:
+                            sink.received.append({"received_at": received_at, "path": self.path, "payload": item})
+                            results.append({"id": item.get("id"), "status": 200})
+                self.send_json(200, {"results": results})
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="webhook-sink", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+# Minimal Discord gateway: HELLO, IDENTIFY/READY, RESUME/RESUMED with replay of missed events,
+# heartbeat ACKs, and MESSAGE_CREATE/MESSAGE_UPDATE dispatches pushed through publish()
+class FakeGatewayServer:
+    def __init__(self, heartbeat_interval_ms: int = 41250):
+        self.heartbeat_interval_ms = heartbeat_interval_ms
+        self.events: List[Dict] = []
+        self.connections = set()
+        self.identifies = 0
+        self.resumes = 0
+        self.loop = None
+        self.server = None
+        self.port = None
+        self.ready = threading.Event()
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/"
+
+    async def send_dispatch(self, ws, event: Dict):
+        await ws.send(json.dumps({"op": 0, "t": event["t"], "s": event["s"], "d": event["d"]}))
+
+    async def handle(self, ws, *args):
+        await ws.send(json.dumps({"op": 10, "d": {"heartbeat_interval": self.heartbeat_interval_ms}}))
+        try:
+            async for raw in ws:
+                payload = json.loads(raw)
+                if payload["op"] == 1:
+                    await ws.send(json.dumps({"op": 11}))
+                elif payload["op"] == 2:
+                    self.identifies += 1
+                    self.connections.add(ws)
+                    sequence = self.events[-1]["s"] if self.events else 0
+                    await ws.send(json.dumps({"op": 0, "t": "READY", "s": sequence, "d": {"session_id": "bench-session", "resume_gateway_url": self.url}}))
+                elif payload["op"] == 6:
+                    self.resumes += 1
+                    for event in self.events:
+                        if event["s"] > (payload["d"].get("seq") or 0):
+                            await self.send_dispatch(ws, event)
+                    self.connections.add(ws)
+                    await ws.send(json.dumps({"op": 0, "t": "RESUMED", "s": None, "d": {}}))
+        except Exception:
+            # Dropped or closed by the client; it will resume on a new connection
+            pass
+        finally:
+            self.connections.discard(ws)
+
+    async def broadcast(self, event: Dict):
+        for ws in list(self.connections):
+            try:
+                await self.send_dispatch(ws, event)
+            except Exception:
+                self.connections.discard(ws)
+
+    def publish(self, channel_id: str, message: Dict, event_type: str = "MESSAGE_CREATE"):
+        event = {"t": event_type, "s": len(self.events) + 1, "d": {**message, "channel_id": channel_id}}
+        self.events.append(event)
+        asyncio.run_coroutine_threadsafe(self.broadcast(event), self.loop)
+
+    def drop_connections(self):
+        async def close_all():
+            for ws in list(self.connections):
+                await ws.close(code=4000)
+        asyncio.run_coroutine_threadsafe(close_all(), self.loop).result()
+
+    def run(self):
+        import websockets
+
+        async def serve():
+            self.server = await websockets.serve(self.handle, "127.0.0.1", 0)
+            self.port = list(self.server.sockets)[0].getsockname()[1]
+            self.ready.set()
+            await asyncio.Future()
+
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(serve())
+
+    def start(self):
+        threading.Thread(target=self.run, name="fake-gateway", daemon=True).start()
+        self.ready.wait(5)
+        return self
@@ -0,0 +1,93 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import config
+import event_log
+
+log = event_log.get_logger("channels")
+
+PROFILES = ("content", "embed")
+
+@dataclass
+class Channel:
+    name: str
+    token: str
+    channel_id: str
+    profile: str = "content"
+    api_version: str = "v10"
+    min_poll_interval: float = 0.0
+    webhook_urls: List[str] = field(default_factory=list)
+    # The instrument this channel's signals trade; its book is keyed and its webhooks sent under it
+    ticker: str = config.TICKER_SYMBOL
+
+channels: Optional[Dict[str, Channel]] = None
+
+def parse_channel(entry: Dict) -> Channel:
+    name = entry.get("name")
+    if not name:
+        raise ValueError(f"Channel entry without a name in {config.CHANNELS_FILE}: {entry}")
+
+    # Tokens can be named by environment variable so the file itself holds no secrets
+    token = entry.get("token") or os.getenv(entry.get("token_env", ""), "")
+    profile = entry.get("profile", "content")
+    if profile not in PROFILES:
+        raise ValueError(f"Channel {name} has unknown profile '{profile}', expected one of {', '.join(PROFILES)}")
+
+    webhook_urls = entry.get("webhook_urls", [])
+    if isinstance(webhook_urls, str):
+        webhook_urls = [webhook_urls]
+
+    return Channel(
+        name=name,
+        token=token,
+        channel_id=str(entry.get("channel_id", "")),
+        profile=profile,
+        api_version=entry.get("api_version", "v10"),
+        min_poll_interval=float(entry.get("min_poll_interval_seconds", 0.0)),
+        webhook_urls=webhook_urls,
+        ticker=entry.get("ticker", config.TICKER_SYMBOL),
+    )
+
+def default_channels() -> List[Channel]:
+    # Without a channels file, the two rooms configured through the environment are followed
+    return [
+        Channel("discord_message", config.TOKEN, config.CHANNEL_ID, "content", "v10"),
+        Channel("second_channel", config.TOKEN_2, config.CHANNEL_ID_2, "embed", "v9"),
+    ]
+
+def load_channels() -> Dict[str, Channel]:
+    if os.path.exists(config.CHANNELS_FILE):
+        with open(config.CHANNELS_FILE, 'r') as f:
+            entries = [parse_channel(entry) for entry in json.load(f).get("channels", [])]
+    else:
+        entries = default_channels()
+
+    loaded = {}
+    for channel in entries:
+        if channel.name in loaded:
+            raise ValueError(f"Duplicate channel name '{channel.name}' in {config.CHANNELS_FILE}")
+        if not channel.token or not channel.channel_id:
+            log.warning("Channel %s has no token or channel id, skipping", channel.name)
+            continue
+        loaded[channel.name] = channel
+    return loaded
+
+def get_channels() -> Dict[str, Channel]:
+    global channels
+    if channels is None:
+        channels = load_channels()
+    return channels
+
+def get_channel(name: str) -> Optional[Channel]:
+    return get_channels().get(name)
+
+def get_ticker(name: str) -> str:
+    channel = get_channel(name)
+    return channel.ticker if channel else config.TICKER_SYMBOL
+
+def get_webhook_urls(name: str) -> List[str]:
+    channel = get_channel(name)
+    if channel and channel.webhook_urls:
+        return channel.webhook_urls
+    return [config.WEBHOOK_URL] if config.WEBHOOK_URL else []
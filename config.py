@@ -8,19 +8,92 @@ TICKER_SYMBOL = "MES"
 GLOBAL_QUANTITY = int(os.getenv("GLOBAL_QUANTITY", "15"))
 GLOBAL_REMAINING_QTY = 3
 
+# Signal rules: minimum Long Triggered score, webhook quantity per ES alert letter, and how far below
+# entry the protective stop goes after a partial exit
+MIN_SIGNAL_SCORE = int(os.getenv("MIN_SIGNAL_SCORE", "5"))
+LETTER_WEBHOOK_QUANTITIES = {"A": GLOBAL_QUANTITY, "B": 8, "C": 5, "R": GLOBAL_QUANTITY}
+STOP_OFFSET_POINTS = float(os.getenv("STOP_OFFSET_POINTS", "3.0"))
+
 TOKEN = os.getenv("DISCORD_TOKEN", "")
 TOKEN_2 = os.getenv("DISCORD_TOKEN_2", "")
 CHANNEL_ID = os.getenv("DISCORD_CHANNEL_ID", "")
 CHANNEL_ID_2 = os.getenv("DISCORD_CHANNEL_ID_2", "")
-API_URL = f"https://discord.com/api/v10/channels/{CHANNEL_ID}/messages?limit=2"
-API_URL_2 = f"https://discord.com/api/v9/channels/{CHANNEL_ID_2}/messages?limit=2"
+CHANNELS_FILE = os.getenv("CHANNELS_FILE", "channels.json")
 
 GENERAL_CHANNEL_TOKEN = os.getenv("GENERAL_CHANNEL_TOKEN", "")
 GENERAL_CHANNEL_ID = os.getenv("GENERAL_CHANNEL_ID", "")
 
+DISCORD_API_BASE = os.getenv("DISCORD_API_BASE", "https://discord.com/api")
+INITIAL_FETCH_LIMIT = int(os.getenv("INITIAL_FETCH_LIMIT", "1"))
+FETCH_PAGE_LIMIT = 100
+MAX_FETCH_PAGES = int(os.getenv("MAX_FETCH_PAGES", "5"))
+REFETCH_LATEST_MESSAGE = os.getenv("REFETCH_LATEST_MESSAGE", "true").lower() == "true"
+CLASSIFICATION_CACHE_SIZE = int(os.getenv("CLASSIFICATION_CACHE_SIZE", "256"))
+
+INGESTION_MODE = os.getenv("INGESTION_MODE", "rest")
+DISCORD_GATEWAY_URL = os.getenv("DISCORD_GATEWAY_URL", "wss://gateway.discord.gg/?v=10&encoding=json")
+GATEWAY_RECONCILE_INTERVAL_SECONDS = float(os.getenv("GATEWAY_RECONCILE_INTERVAL_SECONDS", "5"))
+GATEWAY_MAX_BACKOFF_SECONDS = 30.0
+
 WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_MAX_ATTEMPTS = 5
+WEBHOOK_MARKET_ORDER_MAX_AGE_SECONDS = float(os.getenv("WEBHOOK_MARKET_ORDER_MAX_AGE_SECONDS", "5"))
+WEBHOOK_MAX_AGE_SECONDS = float(os.getenv("WEBHOOK_MAX_AGE_SECONDS", "60"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "0.25"))
+WEBHOOK_RETRY_MAX_BACKOFF_SECONDS = float(os.getenv("WEBHOOK_RETRY_MAX_BACKOFF_SECONDS", "4"))
+WEBHOOK_RETRY_JITTER = 0.5
+WEBHOOK_FANOUT_WORKERS = int(os.getenv("WEBHOOK_FANOUT_WORKERS", "8"))
+WEBHOOK_PIPELINE_CANCEL = os.getenv("WEBHOOK_PIPELINE_CANCEL", "false").lower() == "true"
+WEBHOOK_BATCH_URLS = {url.strip() for url in os.getenv("WEBHOOK_BATCH_URLS", "").split(",") if url.strip()}
+WEBHOOK_BATCH_WINDOW_SECONDS = float(os.getenv("WEBHOOK_BATCH_WINDOW_SECONDS", "0"))
+
+POLL_INTERVAL_SECONDS = float(os.getenv("POLL_INTERVAL_SECONDS", "1"))
+POLL_INTERVAL_FAST_SECONDS = float(os.getenv("POLL_INTERVAL_FAST_SECONDS", "0.5"))
+POLL_INTERVAL_SLOW_SECONDS = float(os.getenv("POLL_INTERVAL_SLOW_SECONDS", "5"))
+MARKET_TIMEZONE = os.getenv("MARKET_TIMEZONE", "America/New_York")
+RTH_START = os.getenv("RTH_START", "09:30")
+RTH_END = os.getenv("RTH_END", "16:00")
+# Channels are followed Monday to Friday in MARKET_TIMEZONE unless the session is forced open
+SESSION_ALWAYS_OPEN = os.getenv("SESSION_ALWAYS_OPEN", "false").lower() == "true"
+# Above 1, channels are sharded across this many worker processes; one owner process keeps dedupe, positions and webhooks
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+# Ticks that overrun their deadline either "merge" into one tick fired straight away or "skip" to the next deadline on the grid
+TICK_OVERRUN_POLICY = os.getenv("TICK_OVERRUN_POLICY", "merge")
+
+# Structured logging: JSON lines (or LOG_FORMAT=text) written by a background thread from a bounded buffer
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_FILE = os.getenv("LOG_FILE", "")
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "10000"))
+LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("LOG_FLUSH_INTERVAL_SECONDS", "0.05"))
+
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "100"))
+NOTIFY_COALESCE_SECONDS = float(os.getenv("NOTIFY_COALESCE_SECONDS", "0.5"))
+NOTIFY_MAX_BATCH = 20
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "8"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+# Warming sends a HEAD to each URL, so only receivers known to ignore it are listed
+WEBHOOK_WARM_UP_URLS = [url.strip() for url in os.getenv("WEBHOOK_WARM_UP_URLS", "").split(",") if url.strip()]
+
+NTFY_URL = "https://ntfy.sh/fcpauldiaz_notifications"
+
+STATE_DIR = os.getenv("STATE_DIR", ".")
+ORDER_FILE = os.path.join(STATE_DIR, "open_order.json")
+DEDUPE_TTL_SECONDS = float(os.getenv("DEDUPE_TTL_SECONDS", str(3 * 24 * 3600)))
+DEDUPE_MAX_ENTRIES = int(os.getenv("DEDUPE_MAX_ENTRIES", "10000"))
+DEDUPE_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("DEDUPE_SNAPSHOT_INTERVAL_SECONDS", "30"))
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_DUMP_INTERVAL_SECONDS = float(os.getenv("METRICS_DUMP_INTERVAL_SECONDS", "60"))
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(STATE_DIR, "archive"))
+ARCHIVE_PAGE_LIMIT = int(os.getenv("ARCHIVE_PAGE_LIMIT", "100"))
 
-ORDER_FILE = "open_order.json"
+JOURNAL_DIR = os.path.join(STATE_DIR, "journal")
+JOURNAL_FSYNC_INTERVAL_SECONDS = float(os.getenv("JOURNAL_FSYNC_INTERVAL_SECONDS", "0.05"))
+JOURNAL_SEGMENT_MAX_BYTES = int(os.getenv("JOURNAL_SEGMENT_MAX_BYTES", str(1024 * 1024)))
 
 PATTERN = re.compile(
     r"ES (long|short) (\d+):\s*(?:([A-Z])(?:\s+\w+)?|(roll(?:\s+w/\s+profits)?))\s*.*?Stop:\s*(?:\d+m\s+close\s+)?(\d+)", re.IGNORECASE | re.DOTALL
@@ -0,0 +1,152 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import config
+import event_log
+
+log = event_log.get_logger("dedupe")
+
+stores: List["DedupeStore"] = []
+snapshot_event = threading.Event()
+snapshot_thread: Optional[threading.Thread] = None
+snapshot_thread_lock = threading.Lock()
+
+def content_key(*parts) -> int:
+    message_content = "_".join(str(part) for part in parts)
+    return int.from_bytes(hashlib.blake2b(message_content.encode(), digest_size=8).digest(), "big")
+
+def message_key(msg_id: Optional[str], content: str = "") -> int:
+    return int(msg_id) if msg_id else content_key(content)
+
+class DedupeStore:
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float, snapshot_path: Optional[str] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.snapshot_path = snapshot_path
+        self.entries: "OrderedDict[int, float]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def contains(self, key: int) -> bool:
+        with self.lock:
+            expires_at = self.entries.get(key)
+            if expires_at is not None and expires_at > time.time():
+                self.hits += 1
+                return True
+            if expires_at is not None:
+                del self.entries[key]
+                self.evictions += 1
+                self.dirty = True
+            self.misses += 1
+            return False
+
+    def add(self, key: int):
+        now = time.time()
+        with self.lock:
+            self.entries[key] = now + self.ttl_seconds
+            self.entries.move_to_end(key)
+            self.evict(now)
+            self.dirty = True
+
+        if self.snapshot_path:
+            request_snapshot()
+
+    def evict(self, now: float):
+        # Entries share one TTL, so insertion order is also expiry order
+        while self.entries:
+            key, expires_at = next(iter(self.entries.items()))
+            if len(self.entries) <= self.max_entries and expires_at > now:
+                break
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def snapshot(self):
+        if not self.snapshot_path:
+            return
+
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"name": self.name, "entries": list(self.entries.items())}
+            self.dirty = False
+
+        try:
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            self.dirty = True
+            log.error("Error writing dedupe snapshot %s: %s", self.snapshot_path, e)
+
+    def load(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            log.error("Error reading dedupe snapshot %s: %s", self.snapshot_path, e)
+            return
+
+        now = time.time()
+        with self.lock:
+            for key, expires_at in sorted(data.get("entries", []), key=lambda entry: entry[1]):
+                if expires_at > now:
+                    self.entries[int(key)] = expires_at
+            self.evict(now)
+        log.info("Loaded %s entries into dedupe store '%s'", len(self.entries), self.name)
+
+def create_store(name: str, persistent: bool = True) -> DedupeStore:
+    snapshot_path = os.path.join(config.STATE_DIR, f"dedupe_{name}.json") if persistent else None
+    store = DedupeStore(name, config.DEDUPE_MAX_ENTRIES, config.DEDUPE_TTL_SECONDS, snapshot_path)
+    store.load()
+    stores.append(store)
+    return store
+
+def snapshot_all():
+    for store in stores:
+        store.snapshot()
+
+def snapshot_writer():
+    while True:
+        snapshot_event.wait(config.DEDUPE_SNAPSHOT_INTERVAL_SECONDS)
+        snapshot_event.clear()
+        snapshot_all()
+
+def request_snapshot():
+    global snapshot_thread
+    if snapshot_thread is None:
+        with snapshot_thread_lock:
+            if snapshot_thread is None:
+                snapshot_thread = threading.Thread(target=snapshot_writer, name="dedupe-snapshot", daemon=True)
+                snapshot_thread.start()
+    snapshot_event.set()
+
+def get_stats() -> Dict[str, Dict[str, int]]:
+    return {store.name: store.stats() for store in stores}
+
+atexit.register(snapshot_all)
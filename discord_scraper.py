@@ -1,53 +1,99 @@
-import requests
-import hashlib
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import config
+import event_log
+import http_client
+import dedupe_store
+import rate_limiter
 
-processed_discord_messages = set()
-logged_invalid_messages = set()
+log = event_log.get_logger("fetch")
+
+processed_discord_messages = dedupe_store.create_store("discord_messages")
+logged_invalid_messages = dedupe_store.create_store("invalid_messages", persistent=False)
+channel_cursors: Dict[str, int] = {}
+DISCORD_EPOCH_MS = 1420070400000
 
 def get_headers(token: str) -> Dict[str, str]:
     return {"Authorization": token}
 
-def fetch_last_message(channel_id: Optional[str] = None, token: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    token = token or config.TOKEN
-    channel_id = channel_id or config.CHANNEL_ID
-    api_url = f"https://discord.com/api/v10/channels/{channel_id}/messages?limit=2"
-    
+def fetch_history_page(channel_id: str, token: str, api_version: str = "v10", before: Optional[int] = None, after: Optional[int] = None, limit: int = 100) -> Optional[List[Dict[str, Any]]]:
+    # One page of history on either side of a snowflake; None when rate limited or on error
+    api_url = f"{config.DISCORD_API_BASE}/{api_version}/channels/{channel_id}/messages"
+    params = {"limit": limit}
+    if before is not None:
+        params["before"] = before
+    if after is not None:
+        params["after"] = after
     try:
-        response = requests.get(api_url, headers=get_headers(token))
-        response.raise_for_status()
-        messages = response.json()
-        if not messages:
+        response = http_client.get(api_url, headers=get_headers(token), params=params)
+        rate_limiter.record_response(token, channel_id, response)
+        if response.status_code == 429:
             return None
-        return messages[0]
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
-        print(f"Error fetching message from channel {channel_id}: {e}")
+        log.error("Error fetching history from channel %s: %s", channel_id, e)
         return None
 
-def fetch_second_channel_messages(limit: int = 2) -> Optional[list]:
+def snowflake_at(epoch_seconds: float) -> int:
+    # The lowest message id Discord could assign at that moment, usable as an after= cursor
+    return max(0, int(epoch_seconds * 1000) - DISCORD_EPOCH_MS) << 22
+
+def advance_cursor(channel_id: str, msg_id: Optional[str]):
+    if not msg_id:
+        return
+    snowflake = int(msg_id)
+    if snowflake > channel_cursors.get(channel_id, 0):
+        channel_cursors[channel_id] = snowflake
+
+def fetch_new_messages(channel_id: str, token: str, api_version: str = "v10") -> Optional[List[Dict[str, Any]]]:
+    api_url = f"{config.DISCORD_API_BASE}/{api_version}/channels/{channel_id}/messages"
+    headers = get_headers(token)
+    cursor = channel_cursors.get(channel_id)
+    
     try:
-        headers = get_headers(config.TOKEN_2)
-        response = requests.get(config.API_URL_2, headers=headers)
-        response.raise_for_status()
-        messages = response.json()
-        if not messages:
-            return None
-        return messages
+        # Without a cursor, seed from the newest message(s); callers advance the
+        # cursor as each message is processed so nothing is skipped on errors
+        if cursor is None:
+            response = http_client.get(api_url, headers=headers, params={"limit": config.INITIAL_FETCH_LIMIT})
+            rate_limiter.record_response(token, channel_id, response)
+            if response.status_code == 429:
+                return None
+            response.raise_for_status()
+            return sorted(response.json(), key=lambda m: int(m["id"]))
+        
+        # Starting one below the cursor re-includes the newest processed message, so an
+        # edit to it is seen; unchanged copies are skipped by the classification cache
+        new_messages = []
+        after = cursor - 1 if config.REFETCH_LATEST_MESSAGE else cursor
+        for _ in range(config.MAX_FETCH_PAGES):
+            if rate_limiter.wait_time(token, channel_id) > 0:
+                break
+            response = http_client.get(api_url, headers=headers, params={"after": after, "limit": config.FETCH_PAGE_LIMIT})
+            rate_limiter.record_response(token, channel_id, response)
+            if response.status_code == 429:
+                break
+            response.raise_for_status()
+            page = response.json()
+            if not page:
+                break
+            page.sort(key=lambda m: int(m["id"]))
+            new_messages.extend(page)
+            after = int(page[-1]["id"])
+            if len(page) < config.FETCH_PAGE_LIMIT:
+                break
+        return new_messages
     except Exception as e:
-        print(f"Error fetching messages from second channel: {e}")
+        log.error("Error fetching new messages from channel %s: %s", channel_id, e)
         return None
 
 def is_discord_message_processed(msg_id: str) -> bool:
-    return msg_id in processed_discord_messages
+    return processed_discord_messages.contains(int(msg_id))
 
 def mark_discord_message_processed(msg_id: str):
-    processed_discord_messages.add(msg_id)
+    processed_discord_messages.add(int(msg_id))
 
 def is_invalid_message_logged(msg_id: Optional[str], content: str = "") -> bool:
-    identifier = msg_id if msg_id else hashlib.md5(content.encode()).hexdigest()
-    return identifier in logged_invalid_messages
+    return logged_invalid_messages.contains(dedupe_store.message_key(msg_id, content))
 
 def mark_invalid_message_logged(msg_id: Optional[str], content: str = ""):
-    identifier = msg_id if msg_id else hashlib.md5(content.encode()).hexdigest()
-    logged_invalid_messages.add(identifier)
+    logged_invalid_messages.add(dedupe_store.message_key(msg_id, content))
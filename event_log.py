@@ -0,0 +1,145 @@
+import atexit
+import contextvars
+import json
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Optional, Tuple
+import config
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40, "off": 100}
+min_level = LEVELS.get(config.LOG_LEVEL.lower(), LEVELS["info"])
+
+# The Discord message being handled and the channel it came from. Position actors and webhook
+# fan-out copy the caller's context, so every line written on behalf of a signal carries its id.
+current_signal: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_signal", default=None)
+current_source: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_source", default=None)
+
+# (time, level, stage, message, args, fields, signal, source). Messages are only formatted and
+# encoded on the writer thread; callers just append, and when the writer falls behind the
+# oldest records are overwritten rather than the caller waiting.
+Record = Tuple[float, str, str, str, tuple, Dict[str, Any], Optional[str], Optional[str]]
+records: Deque[Record] = deque(maxlen=config.LOG_BUFFER_SIZE)
+records_ready = threading.Event()
+write_lock = threading.Lock()
+writer_thread: Optional[threading.Thread] = None
+writer_lock = threading.Lock()
+stats = {"logged": 0, "written": 0, "dropped": 0}
+# Set in shard worker processes so their lines can be told apart from the owner's
+process_name: Optional[str] = None
+
+def ensure_writer():
+    global writer_thread
+    if writer_thread is not None:
+        return
+    with writer_lock:
+        if writer_thread is None:
+            writer_thread = threading.Thread(target=run_writer, name="log-writer", daemon=True)
+            writer_thread.start()
+
+def start_signal(msg_id: Optional[str], source: str):
+    current_signal.set(msg_id)
+    current_source.set(source)
+
+def log(level: str, stage: str, message: str, args: tuple, fields: Dict[str, Any]):
+    if LEVELS[level] < min_level:
+        return
+    signal = current_signal.get()
+    source = current_source.get()
+    if fields:
+        if fields.pop("exc_info", False):
+            fields["exception"] = traceback.format_exc()
+        signal = fields.pop("signal", None) or signal
+        source = fields.pop("source", None) or source
+    if len(records) == records.maxlen:
+        stats["dropped"] += 1
+    records.append((time.time(), level, stage, message, args, fields, signal, source))
+    stats["logged"] += 1
+    if writer_thread is None:
+        ensure_writer()
+    # Setting an already-set event still takes its lock, so only the first record of a burst does
+    if not records_ready.is_set():
+        records_ready.set()
+
+def format_record(record: Record) -> str:
+    logged_at, level, stage, message, args, fields, signal, source = record
+    if args:
+        try:
+            message = message % args
+        except (TypeError, ValueError):
+            message = f"{message} {args}"
+    entry = {
+        "ts": datetime.fromtimestamp(logged_at, timezone.utc).isoformat(timespec="milliseconds"),
+        "level": level,
+        "stage": stage,
+        "msg": message,
+    }
+    if signal:
+        entry["signal"] = signal
+    if source:
+        entry["source"] = source
+    if process_name:
+        entry["process"] = process_name
+    entry.update((name, value) for name, value in fields.items() if value is not None)
+    if config.LOG_FORMAT == "text":
+        context = " ".join(f"{name}={value}" for name, value in entry.items() if name not in ("ts", "level", "stage", "msg"))
+        return f"{entry['ts']} {level.upper():7} [{stage}] {message}" + (f" ({context})" if context else "")
+    return json.dumps(entry, default=str)
+
+def flush():
+    # Drains whatever is buffered in one write; the writer thread and exit both come through here
+    with write_lock:
+        lines = []
+        while records:
+            try:
+                lines.append(format_record(records.popleft()))
+            except IndexError:
+                break
+        if not lines:
+            return
+        text = "\n".join(lines) + "\n"
+        try:
+            if config.LOG_FILE:
+                with open(config.LOG_FILE, 'a') as f:
+                    f.write(text)
+            else:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            stats["written"] += len(lines)
+        except Exception:
+            stats["dropped"] += len(lines)
+
+def run_writer():
+    while True:
+        records_ready.wait()
+        # A short pause lets a burst from one signal go out as a single write
+        time.sleep(config.LOG_FLUSH_INTERVAL_SECONDS)
+        records_ready.clear()
+        flush()
+
+def get_stats() -> Dict[str, int]:
+    return {"buffered": len(records), **stats}
+
+class Logger:
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def debug(self, message: str, *args, **fields):
+        log("debug", self.stage, message, args, fields)
+
+    def info(self, message: str, *args, **fields):
+        log("info", self.stage, message, args, fields)
+
+    def warning(self, message: str, *args, **fields):
+        log("warning", self.stage, message, args, fields)
+
+    def error(self, message: str, *args, **fields):
+        log("error", self.stage, message, args, fields)
+
+def get_logger(stage: str) -> Logger:
+    return Logger(stage)
+
+atexit.register(flush)
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import random
+from typing import Awaitable, Callable, Dict
+import config
+import event_log
+
+log = event_log.get_logger("gateway")
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+OP_DISPATCH = 0
+OP_HEARTBEAT = 1
+OP_IDENTIFY = 2
+OP_RESUME = 6
+OP_RECONNECT = 7
+OP_INVALID_SESSION = 9
+OP_HELLO = 10
+OP_HEARTBEAT_ACK = 11
+
+# GUILD_MESSAGES | DIRECT_MESSAGES | MESSAGE_CONTENT
+INTENTS = (1 << 9) | (1 << 12) | (1 << 15)
+MESSAGE_EVENTS = ("MESSAGE_CREATE", "MESSAGE_UPDATE")
+
+# One gateway session per token: session id, last sequence, resume url and liveness
+sessions: Dict[str, Dict] = {}
+stats = {"events": 0, "identifies": 0, "resumes": 0, "reconnects": 0}
+
+def is_available() -> bool:
+    return websockets is not None
+
+def get_session(token: str) -> Dict:
+    return sessions.setdefault(token, {"session_id": None, "sequence": None, "resume_url": None, "connected": False, "acked": True})
+
+def is_connected(token: str) -> bool:
+    return get_session(token)["connected"]
+
+def gateway_url(base_url: str) -> str:
+    separator = "&" if "?" in base_url else "?"
+    return base_url if "encoding=" in base_url else f"{base_url}{separator}v=10&encoding=json"
+
+async def send(ws, op: int, data):
+    await ws.send(json.dumps({"op": op, "d": data}))
+
+async def heartbeat(ws, session: Dict, interval: float):
+    await asyncio.sleep(interval * random.random())
+    while True:
+        if not session["acked"]:
+            # No ACK since the last beat: the connection is a zombie, force a reconnect
+            log.warning("Gateway heartbeat not acknowledged, reconnecting")
+            await ws.close(code=4000)
+            return
+        session["acked"] = False
+        await send(ws, OP_HEARTBEAT, session["sequence"])
+        await asyncio.sleep(interval)
+
+async def identify_or_resume(ws, token: str, session: Dict):
+    if session["session_id"] and session["sequence"] is not None:
+        stats["resumes"] += 1
+        await send(ws, OP_RESUME, {"token": token, "session_id": session["session_id"], "seq": session["sequence"]})
+    else:
+        stats["identifies"] += 1
+        await send(ws, OP_IDENTIFY, {
+            "token": token,
+            "intents": INTENTS,
+            "properties": {"os": "linux", "browser": "futures-discord-trading-bot", "device": "futures-discord-trading-bot"}
+        })
+
+async def run_session(ws, token: str, on_message: Callable[[str, Dict], Awaitable[None]]):
+    session = get_session(token)
+    hello = json.loads(await ws.recv())
+    if hello.get("op") != OP_HELLO:
+        raise RuntimeError(f"Expected HELLO from gateway, got op {hello.get('op')}")
+
+    session["acked"] = True
+    heartbeat_task = asyncio.create_task(heartbeat(ws, session, hello["d"]["heartbeat_interval"] / 1000))
+    try:
+        await identify_or_resume(ws, token, session)
+        async for raw in ws:
+            payload = json.loads(raw)
+            op = payload.get("op")
+            if payload.get("s") is not None:
+                session["sequence"] = payload["s"]
+
+            if op == OP_DISPATCH:
+                event_type = payload.get("t")
+                if event_type == "READY":
+                    session["session_id"] = payload["d"]["session_id"]
+                    session["resume_url"] = payload["d"].get("resume_gateway_url")
+                    session["connected"] = True
+                    log.info("Gateway session ready")
+                elif event_type == "RESUMED":
+                    session["connected"] = True
+                    log.info("Gateway session resumed")
+                elif event_type in MESSAGE_EVENTS:
+                    stats["events"] += 1
+                    await on_message(event_type, payload["d"])
+            elif op == OP_HEARTBEAT:
+                await send(ws, OP_HEARTBEAT, session["sequence"])
+            elif op == OP_HEARTBEAT_ACK:
+                session["acked"] = True
+            elif op == OP_RECONNECT:
+                log.info("Gateway requested reconnect")
+                return
+            elif op == OP_INVALID_SESSION:
+                if not payload.get("d"):
+                    session.update({"session_id": None, "sequence": None, "resume_url": None})
+                await asyncio.sleep(random.uniform(1, 5))
+                return
+    finally:
+        session["connected"] = False
+        heartbeat_task.cancel()
+
+async def run(token: str, on_message: Callable[[str, Dict], Awaitable[None]]):
+    if not is_available():
+        log.warning("websockets is not installed, gateway ingestion disabled (REST polling only)")
+        return
+
+    session = get_session(token)
+    backoff = 1.0
+    while True:
+        url = gateway_url(session["resume_url"] or config.DISCORD_GATEWAY_URL)
+        delay = 0.0
+        try:
+            async with websockets.connect(url, max_size=None) as ws:
+                backoff = 1.0
+                await run_session(ws, token, on_message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Gateway connection error: %s", e)
+            # Only failures back off; a requested reconnect resumes straight away
+            delay = backoff + random.uniform(0, backoff / 2)
+            backoff = min(backoff * 2, config.GATEWAY_MAX_BACKOFF_SECONDS)
+
+        session["connected"] = False
+        stats["reconnects"] += 1
+        log.info("Gateway disconnected, reconnecting in %.1fs (REST polling covers the gap)", delay)
+        await asyncio.sleep(delay)
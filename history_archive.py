@@ -0,0 +1,353 @@
+import argparse
+import json
+import math
+import mmap
+import os
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+import config
+import channel_registry
+import discord_scraper
+import message_parser
+import rate_limiter
+
+# A channel's archive is two append-only column sets. "older" grows backwards from the first
+# message archived (before= pages, newest first) and "newer" grows forwards (after= pages, oldest
+# first), so every write is an append and the full history is reversed(older) + newer.
+PARTS = ("older", "newer")
+
+# Column name -> array typecode. Numeric fields a signal does not carry are NaN.
+COLUMNS = {
+    "id": "Q",
+    "time": "d",
+    "type": "B",
+    "flags": "B",
+    "letter": "B",
+    "price": "d",
+    "stop": "d",
+    "level": "d",
+    "target": "d",
+    "pnl": "d",
+    "score": "d",
+    "fraction": "d",
+    "content_offset": "Q",
+    "content_length": "I",
+}
+NUMERIC_FIELDS = ("price", "stop", "level", "target", "pnl", "score", "fraction")
+
+FLAG_MENTION_EVERYONE = 1
+FLAG_EDITED = 2
+FLAG_SHORT = 4
+
+# Type 0 is a message that is not a signal
+SIGNAL_TYPES = (
+    None,
+    message_parser.SIGNAL_STOPPED,
+    message_parser.SIGNAL_TRIM,
+    message_parser.SIGNAL_ES_ORDER,
+    message_parser.SIGNAL_TARGET_HIT,
+    message_parser.SIGNAL_TARGET2_HIT,
+    message_parser.SIGNAL_STOP_LOSS,
+    message_parser.SIGNAL_STOP_LOSS_SIMPLE,
+    message_parser.SIGNAL_LONG_TRIGGERED,
+)
+TYPE_CODES = {signal_type: code for code, signal_type in enumerate(SIGNAL_TYPES)}
+
+# Which match group feeds which numeric column, per signal type
+FIELD_GROUPS = {
+    message_parser.SIGNAL_ES_ORDER: {"price": 2, "stop": 5},
+    message_parser.SIGNAL_LONG_TRIGGERED: {"level": 3, "score": 4, "price": 5},
+    message_parser.SIGNAL_TARGET_HIT: {"level": 3, "target": 4, "price": 5, "pnl": 6},
+    message_parser.SIGNAL_TARGET2_HIT: {"level": 3, "target": 4, "price": 5, "pnl": 6},
+    message_parser.SIGNAL_STOP_LOSS: {"level": 3, "price": 4, "stop": 5, "pnl": 6},
+    message_parser.SIGNAL_STOP_LOSS_SIMPLE: {"level": 3, "price": 4, "stop": 5, "pnl": 6},
+}
+
+def channel_dir(name: str) -> str:
+    return os.path.join(config.ARCHIVE_DIR, name)
+
+def column_path(directory: str, part: str, column: str) -> str:
+    return os.path.join(directory, part, f"{column}.{COLUMNS[column]}")
+
+def blob_path(directory: str, part: str) -> str:
+    return os.path.join(directory, part, "content.blob")
+
+def checkpoint_path(directory: str) -> str:
+    return os.path.join(directory, "checkpoint.json")
+
+def empty_checkpoint() -> Dict:
+    return {
+        "byteorder": sys.byteorder,
+        "older": {"rows": 0, "blob_bytes": 0},
+        "newer": {"rows": 0, "blob_bytes": 0},
+        "oldest_id": None,
+        "newest_id": None,
+        "backfill_complete": False,
+    }
+
+def read_checkpoint(directory: str) -> Dict:
+    path = checkpoint_path(directory)
+    if not os.path.exists(path):
+        return empty_checkpoint()
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("byteorder") != sys.byteorder:
+        raise ValueError(f"Archive {directory} was written on a {checkpoint.get('byteorder')}-endian machine")
+    return checkpoint
+
+def write_checkpoint(directory: str, checkpoint: Dict):
+    tmp_path = f"{checkpoint_path(directory)}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, checkpoint_path(directory))
+
+def parse_number(value: Optional[str]) -> float:
+    if not value:
+        return math.nan
+    # Scores arrive as "6/7"; the numerator is what the rules compare
+    return float(value.split("/")[0])
+
+def extract_row(msg: Dict, profile: str) -> Dict:
+    text = message_parser.message_text(msg, profile)
+    signal_type, match = message_parser.classify(text, message_parser.PROFILE_RULES[profile])
+    row = {field: math.nan for field in NUMERIC_FIELDS}
+    row["letter"] = 0
+    flags = 0
+    if msg.get("mention_everyone"):
+        flags |= FLAG_MENTION_EVERYONE
+    if msg.get("edited_timestamp"):
+        flags |= FLAG_EDITED
+
+    if signal_type == message_parser.SIGNAL_TRIM:
+        row["fraction"] = int(match.group(1)) / int(match.group(2))
+    elif signal_type == message_parser.SIGNAL_ES_ORDER:
+        if match.group(1).lower() == "short":
+            flags |= FLAG_SHORT
+        if match.group(3):
+            row["letter"] = ord(match.group(3).upper())
+    for field, group in FIELD_GROUPS.get(signal_type, {}).items():
+        row[field] = parse_number(match.group(group))
+
+    row.update({
+        "id": int(msg["id"]),
+        "time": datetime.fromisoformat(msg["timestamp"].replace("Z", "+00:00")).timestamp(),
+        "type": TYPE_CODES[signal_type],
+        "flags": flags,
+        "text": text.encode("utf-8"),
+    })
+    return row
+
+class ArchiveWriter:
+    def __init__(self, name: str):
+        self.directory = channel_dir(name)
+        for part in PARTS:
+            os.makedirs(os.path.join(self.directory, part), exist_ok=True)
+        self.checkpoint = read_checkpoint(self.directory)
+        # Anything past the checkpoint is a page that was cut off mid-write; drop it
+        for part in PARTS:
+            state = self.checkpoint[part]
+            for column, typecode in COLUMNS.items():
+                truncate(column_path(self.directory, part, column), state["rows"] * array(typecode).itemsize)
+            truncate(blob_path(self.directory, part), state["blob_bytes"])
+
+    def append(self, part: str, rows: List[Dict]):
+        if not rows:
+            return
+        state = self.checkpoint[part]
+        offset = state["blob_bytes"]
+        columns = {column: array(typecode) for column, typecode in COLUMNS.items()}
+        for row in rows:
+            row["content_offset"] = offset
+            row["content_length"] = len(row["text"])
+            offset += row["content_length"]
+            for column, values in columns.items():
+                values.append(row[column])
+
+        with open(blob_path(self.directory, part), 'ab') as f:
+            for row in rows:
+                f.write(row["text"])
+            f.flush()
+            os.fsync(f.fileno())
+        for column, values in columns.items():
+            with open(column_path(self.directory, part, column), 'ab') as f:
+                values.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+
+        # The checkpoint is the commit point: rows only count once it names them
+        state["rows"] += len(rows)
+        state["blob_bytes"] = offset
+        ids = [row["id"] for row in rows]
+        if self.checkpoint["oldest_id"] is None or min(ids) < self.checkpoint["oldest_id"]:
+            self.checkpoint["oldest_id"] = min(ids)
+        if self.checkpoint["newest_id"] is None or max(ids) > self.checkpoint["newest_id"]:
+            self.checkpoint["newest_id"] = max(ids)
+        write_checkpoint(self.directory, self.checkpoint)
+
+    def complete_backfill(self):
+        self.checkpoint["backfill_complete"] = True
+        write_checkpoint(self.directory, self.checkpoint)
+
+def truncate(path: str, size: int):
+    if not os.path.exists(path):
+        open(path, 'wb').close()
+    if os.path.getsize(path) != size:
+        os.truncate(path, size)
+
+def fetch_page(channel: channel_registry.Channel, before: Optional[int] = None, after: Optional[int] = None) -> List[Dict]:
+    # Waits out rate limits rather than giving up, since an archive run has no deadline
+    while True:
+        delay = rate_limiter.wait_time(channel.token, channel.channel_id)
+        if delay > 0:
+            time.sleep(delay)
+        page = discord_scraper.fetch_history_page(channel.channel_id, channel.token, channel.api_version, before, after, config.ARCHIVE_PAGE_LIMIT)
+        if page is not None:
+            return page
+        time.sleep(max(rate_limiter.wait_time(channel.token, channel.channel_id), 1.0))
+
+def backfill(channel: channel_registry.Channel, max_pages: Optional[int] = None) -> int:
+    writer = ArchiveWriter(channel.name)
+    archived = 0
+    pages = 0
+    while not writer.checkpoint["backfill_complete"] and (max_pages is None or pages < max_pages):
+        page = fetch_page(channel, before=writer.checkpoint["oldest_id"])
+        pages += 1
+        page.sort(key=lambda msg: int(msg["id"]), reverse=True)
+        writer.append("older", [extract_row(msg, channel.profile) for msg in page])
+        archived += len(page)
+        if len(page) < config.ARCHIVE_PAGE_LIMIT:
+            writer.complete_backfill()
+    print(f"Backfilled {archived} message(s) from {channel.name}")
+    return archived
+
+def sync(channel: channel_registry.Channel) -> int:
+    writer = ArchiveWriter(channel.name)
+    if writer.checkpoint["newest_id"] is None and not writer.checkpoint["backfill_complete"]:
+        # An empty archive is seeded from the newest page, which also anchors the backfill
+        return backfill(channel, max_pages=1)
+    archived = 0
+    while True:
+        page = fetch_page(channel, after=writer.checkpoint["newest_id"] or 0)
+        page.sort(key=lambda msg: int(msg["id"]))
+        writer.append("newer", [extract_row(msg, channel.profile) for msg in page])
+        archived += len(page)
+        if len(page) < config.ARCHIVE_PAGE_LIMIT:
+            break
+    print(f"Synced {archived} new message(s) from {channel.name}")
+    return archived
+
+class ArchivePart:
+    def __init__(self, directory: str, part: str, state: Dict):
+        self.rows = state["rows"]
+        self.maps = []
+        self.columns: Dict[str, memoryview] = {}
+        for column, typecode in COLUMNS.items():
+            size = self.rows * array(typecode).itemsize
+            self.columns[column] = self.map(column_path(directory, part, column), size).cast(typecode)
+        self.blob = self.map(blob_path(directory, part), state["blob_bytes"])
+
+    def map(self, path: str, size: int) -> memoryview:
+        # Only the bytes the checkpoint covers are exposed, even while a writer is appending
+        if size == 0:
+            return memoryview(b"")
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(mapped)
+        return memoryview(mapped)[:size]
+
+    def close(self):
+        for view in self.columns.values():
+            view.release()
+        self.blob.release()
+        for mapped in self.maps:
+            mapped.close()
+
+class ArchiveReader:
+    def __init__(self, name: str):
+        self.name = name
+        self.directory = channel_dir(name)
+        self.checkpoint = read_checkpoint(self.directory)
+        self.parts = {part: ArchivePart(self.directory, part, self.checkpoint[part]) for part in PARTS}
+
+    def __len__(self) -> int:
+        return sum(part.rows for part in self.parts.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def column(self, column: str) -> array:
+        # Oldest first; both halves are copied straight out of the mapped pages
+        values = array(COLUMNS[column])
+        values.frombytes(self.parts["older"].columns[column][::-1].tobytes())
+        values.frombytes(self.parts["newer"].columns[column].tobytes())
+        return values
+
+    def rows(self) -> Iterator[tuple]:
+        # (part, index) pairs in ascending snowflake order
+        older = self.parts["older"]
+        for index in range(older.rows - 1, -1, -1):
+            yield older, index
+        newer = self.parts["newer"]
+        for index in range(newer.rows):
+            yield newer, index
+
+    def text(self, part: ArchivePart, index: int) -> str:
+        offset = part.columns["content_offset"][index]
+        return bytes(part.blob[offset:offset + part.columns["content_length"][index]]).decode("utf-8")
+
+    def messages(self, channel_id: str = "", profile: str = "content") -> Iterator[Dict]:
+        # Rebuilds the fields the handlers read, so archived history can be replayed like an export
+        for part, index in self.rows():
+            columns = part.columns
+            text = self.text(part, index)
+            yield {
+                "id": str(columns["id"][index]),
+                "channel_id": channel_id,
+                "timestamp": datetime.fromtimestamp(columns["time"][index], timezone.utc).isoformat(),
+                "edited_timestamp": None,
+                "mention_everyone": bool(columns["flags"][index] & FLAG_MENTION_EVERYONE),
+                "content": text if profile == "content" else "",
+                "embeds": [{"description": text}] if profile == "embed" else [],
+            }
+
+    def close(self):
+        for part in self.parts.values():
+            part.close()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Archive channel history into per-channel column files")
+    parser.add_argument("command", choices=("backfill", "sync", "stats"), help="page backwards to the start of the channel, fetch what is newer than the archive, or summarize it")
+    parser.add_argument("channels", nargs="*", help="channel names from the registry (default: all)")
+    parser.add_argument("--max-pages", type=int, help="stop a backfill after this many pages; the next run resumes from the checkpoint")
+    args = parser.parse_args(argv)
+
+    channels = channel_registry.get_channels()
+    names = args.channels or list(channels)
+    for name in names:
+        channel = channels.get(name)
+        if channel is None:
+            print(f"Unknown channel {name}")
+            return 1
+        if args.command == "backfill":
+            backfill(channel, args.max_pages)
+        elif args.command == "sync":
+            sync(channel)
+        else:
+            started = time.perf_counter()
+            with ArchiveReader(name) as reader:
+                types = reader.column("type")
+                signals = len(types) - types.count(0)
+                complete = "complete" if reader.checkpoint["backfill_complete"] else "partial"
+                print(f"{name}: {len(reader)} message(s), {signals} signal(s), backfill {complete}, read in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
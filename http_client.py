@@ -0,0 +1,61 @@
+import threading
+from typing import Dict, List
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import config
+import event_log
+
+log = event_log.get_logger("http")
+
+sessions: Dict[str, requests.Session] = {}
+sessions_lock = threading.Lock()
+
+def get_host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+def create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=config.HTTP_POOL_MAXSIZE,
+        max_retries=0,
+        pool_block=False
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+def get_session(url: str) -> requests.Session:
+    host_key = get_host_key(url)
+    session = sessions.get(host_key)
+    if session is not None:
+        return session
+    
+    with sessions_lock:
+        session = sessions.get(host_key)
+        if session is None:
+            session = create_session()
+            sessions[host_key] = session
+        return session
+
+def get(url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", config.HTTP_TIMEOUT_SECONDS)
+    return get_session(url).get(url, **kwargs)
+
+def post(url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", config.HTTP_TIMEOUT_SECONDS)
+    return get_session(url).post(url, **kwargs)
+
+def warm_up(urls: List[str]):
+    for url in urls:
+        if not url:
+            continue
+        try:
+            # Any response proves the TCP connection and TLS session are established and pooled
+            get_session(url).head(url, timeout=config.HTTP_TIMEOUT_SECONDS, allow_redirects=False)
+            log.info("Connection pool warmed for %s", get_host_key(url))
+        except Exception as e:
+            log.error("Error warming connection pool for %s: %s", get_host_key(url), e)
@@ -0,0 +1,175 @@
+import contextvars
+import functools
+import http.server
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import config
+import dedupe_store
+import event_log
+import notifier
+
+log = event_log.get_logger("metrics")
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_NAME = "signal_stage_seconds"
+
+# stage + sorted labels -> [bucket counts..., +Inf count, sum]
+histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = {}
+histograms_lock = threading.Lock()
+
+# metric + sorted labels -> running total
+counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+# Wall-clock time the signal being handled was posted on Discord, for end-to-end timings
+signal_posted_at: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("signal_posted_at", default=None)
+
+def observe(stage: str, seconds: float, **labels):
+    key = (stage, tuple(sorted((name, str(value)) for name, value in labels.items())))
+    with histograms_lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = [0] * (len(BUCKETS) + 1) + [0.0]
+            histograms[key] = histogram
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[index] += 1
+                break
+        else:
+            histogram[len(BUCKETS)] += 1
+        histogram[-1] += seconds
+
+def increment(metric: str, amount: float = 1, **labels):
+    key = (metric, tuple(sorted((name, str(value)) for name, value in labels.items())))
+    with histograms_lock:
+        counters[key] = counters.get(key, 0) + amount
+
+@contextmanager
+def timer(stage: str, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started, **labels)
+
+def timed(stage: str, **labels):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def parse_discord_timestamp(timestamp: Optional[str]) -> Optional[float]:
+    if not timestamp:
+        return None
+    try:
+        posted = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return None
+    if posted.tzinfo is None:
+        posted = posted.replace(tzinfo=timezone.utc)
+    return posted.timestamp()
+
+def start_signal(msg: Dict, channel: str):
+    posted_at = parse_discord_timestamp(msg.get("timestamp"))
+    signal_posted_at.set(posted_at)
+    if posted_at is not None:
+        observe("discord_to_fetch", max(0.0, time.time() - posted_at), channel=channel)
+
+def observe_since_signal(stage: str, posted_at: Optional[float], **labels):
+    if posted_at is not None:
+        observe(stage, max(0.0, time.time() - posted_at), **labels)
+
+def format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    return ",".join(f'{name}="{value}"' for name, value in pairs)
+
+def render_prometheus() -> str:
+    lines = [f"# TYPE {METRIC_NAME} histogram"]
+    with histograms_lock:
+        snapshot = {key: list(values) for key, values in histograms.items()}
+        counter_snapshot = dict(counters)
+
+    for (stage, labels), values in sorted(snapshot.items()):
+        stage_labels = (("stage", stage),) + labels
+        cumulative = 0
+        for index, bound in enumerate(BUCKETS):
+            cumulative += values[index]
+            lines.append(f"{METRIC_NAME}_bucket{{{format_labels(stage_labels, ('le', str(bound)))}}} {cumulative}")
+        cumulative += values[len(BUCKETS)]
+        lines.append(f"{METRIC_NAME}_bucket{{{format_labels(stage_labels, ('le', '+Inf'))}}} {cumulative}")
+        lines.append(f"{METRIC_NAME}_sum{{{format_labels(stage_labels)}}} {values[-1]:.6f}")
+        lines.append(f"{METRIC_NAME}_count{{{format_labels(stage_labels)}}} {cumulative}")
+    typed = set()
+    for (metric, labels), value in sorted(counter_snapshot.items()):
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{{{format_labels(labels)}}} {value:g}")
+    lines.extend(render_component_stats())
+    return "\n".join(lines) + "\n"
+
+def render_component_stats() -> List[str]:
+    # Queues and stores keep their own counters; they are read here rather than mirrored on every event
+    notify = notifier.get_stats()
+    lines = ["# TYPE ntfy_queue_depth gauge", f"ntfy_queue_depth {notify['depth']}", "# TYPE ntfy_notifications_total counter"]
+    lines.extend(f'ntfy_notifications_total{{outcome="{outcome}"}} {notify[outcome]}' for outcome in ("enqueued", "coalesced", "sent", "dropped", "failed"))
+
+    stores = sorted(dedupe_store.get_stats().items())
+    lines.append("# TYPE dedupe_entries gauge")
+    lines.extend(f'dedupe_entries{{store="{name}"}} {store["size"]}' for name, store in stores)
+    lines.append("# TYPE dedupe_lookups_total counter")
+    for name, store in stores:
+        lines.append(f'dedupe_lookups_total{{store="{name}",result="hit"}} {store["hits"]}')
+        lines.append(f'dedupe_lookups_total{{store="{name}",result="miss"}} {store["misses"]}')
+    lines.append("# TYPE dedupe_evictions_total counter")
+    lines.extend(f'dedupe_evictions_total{{store="{name}"}} {store["evictions"]}' for name, store in stores)
+
+    logs = event_log.get_stats()
+    lines += ["# TYPE log_records_buffered gauge", f"log_records_buffered {logs['buffered']}", "# TYPE log_records_total counter"]
+    lines.extend(f'log_records_total{{outcome="{outcome}"}} {logs[outcome]}' for outcome in ("logged", "written", "dropped"))
+    return lines
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(port: int):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    log.info("Serving latency metrics on http://127.0.0.1:%s/metrics", port)
+    return server
+
+def dump_loop(path: str, interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(render_prometheus())
+            os.replace(tmp_path, path)
+        except Exception as e:
+            log.error("Error dumping latency metrics: %s", e)
+
+def start(name: str = "metrics"):
+    if config.METRICS_PORT:
+        start_http_server(config.METRICS_PORT)
+    if config.METRICS_DUMP_INTERVAL_SECONDS > 0:
+        path = os.path.join(config.STATE_DIR, f"{name}.prom")
+        threading.Thread(target=dump_loop, args=(path, config.METRICS_DUMP_INTERVAL_SECONDS), name="metrics-dump", daemon=True).start()
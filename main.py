@@ -1,29 +1,42 @@
-import time
+import asyncio
+import functools
+import threading
 from datetime import datetime
 import config
+import event_log
 import discord_scraper
 import message_parser
 import order_executor
 import position_tracker
+import position_actor
+import poller
+import http_client
+import latency_metrics
+import market_session
+import rate_limiter
+import gateway_client
+import channel_registry
+import supervisor
 
-def is_weekday() -> bool:
-    return datetime.now().weekday() < 5
+log = event_log.get_logger("handler")
 
-def handle_trim_message(trim_match):
-    if not position_tracker.has_open_order():
-        print("No open order to trim")
+@latency_metrics.timed("handler", handler="trim")
+def handle_trim_message(trim_match, source="discord_message"):
+    key = position_tracker.position_key(channel_registry.get_ticker(source), source)
+    if not position_tracker.has_open_order(key):
+        log.info("No open order to trim")
         return
     
-    order_info = position_tracker.get_open_order_info()
+    order_info = position_tracker.get_open_order_info(key)
     if not order_info:
-        print("Could not retrieve order info")
+        log.warning("Could not retrieve order info")
         return
     
     numerator = int(trim_match.group(1))
     denominator = int(trim_match.group(2))
     trim_percentage = numerator / denominator
     
-    print(f"Trim message: {numerator}/{denominator} = {trim_percentage:.2%}")
+    log.info("Trim message: %s/%s = %.2f%%", numerator, denominator, trim_percentage * 100)
     
     original_action = order_info["order_info"]["action"]
     original_quantities = order_info["order_info"]["quantities"]
@@ -34,29 +47,29 @@ def handle_trim_message(trim_match):
     personal_close_qty = int(original_quantities["personal"] * trim_percentage)
     webhook_close_qty = int(original_quantities["webhook"] * trim_percentage)
     
-    print(f"Closing quantities: Personal={personal_close_qty}, Webhook={webhook_close_qty}")
+    log.debug("Closing quantities: Personal=%s, Webhook=%s", personal_close_qty, webhook_close_qty)
     
     try:
         if personal_close_qty >= 1:
-            print(f"Would submit personal close order: qty={personal_close_qty}, is_buy={close_is_buy}")
+            log.info("Would submit personal close order: qty=%s, is_buy=%s", personal_close_qty, close_is_buy)
         else:
-            print(f"Skipping personal close order - quantity is {personal_close_qty} (must be >= 1)")
+            log.warning("Skipping personal close order - quantity is %s (must be >= 1)", personal_close_qty)
         
         if webhook_close_qty >= 1:
             webhook_payload = {
-                "ticker": config.TICKER_SYMBOL,
+                "ticker": channel_registry.get_ticker(source),
                 "price": "",
                 "action": "sell",
                 "orderType": "market"
             }
             
-            order_executor.send_webhook(webhook_payload, config.WEBHOOK_URL, webhook_close_qty, "Close webhook")
+            order_executor.send_webhook_to_multiple_urls(webhook_payload, channel_registry.get_webhook_urls(source), "Close webhook", webhook_close_qty)
         else:
-            print(f"Skipping webhook submission - quantity is {webhook_close_qty} (must be >= 1)")
+            log.warning("Skipping webhook submission - quantity is %s (must be >= 1)", webhook_close_qty)
         
         if trim_percentage >= 1.0:
-            position_tracker.clear_open_order()
-            print("Order fully closed and cleared")
+            position_tracker.clear_open_order(key, "exit")
+            log.info("Order fully closed and cleared")
         else:
             remaining_quantities = {
                 "personal": original_quantities["personal"] - personal_close_qty,
@@ -64,71 +77,161 @@ def handle_trim_message(trim_match):
             }
             
             order_info["order_info"]["quantities"] = remaining_quantities
-            position_tracker.save_open_order(order_info["order_info"])
-            print(f"Order updated with remaining quantities: {remaining_quantities}")
+            position_tracker.save_open_order(order_info["order_info"], "trim")
+            log.info("Order updated with remaining quantities: %s", remaining_quantities)
             
             if numerator == 1 and denominator == 8:
                 entry_price = order_info["order_info"].get("price")
                 remaining_webhook_qty = remaining_quantities.get("webhook", 0)
                 if entry_price is None:
-                    print("Cannot place stop after 1/8 trim - original entry price not available")
+                    log.warning("Cannot place stop after 1/8 trim - original entry price not available")
                 elif remaining_webhook_qty < 1:
-                    print(f"Skipping stop order submission after 1/8 trim - quantity is {remaining_webhook_qty} (must be >= 1)")
+                    log.warning("Skipping stop order submission after 1/8 trim - quantity is %s (must be >= 1)", remaining_webhook_qty)
                 else:
-                    stop_price = float(entry_price) - 3.0
+                    stop_price = float(entry_price) - config.STOP_OFFSET_POINTS
                     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
                     stop_webhook_payload = {
-                        "ticker": config.TICKER_SYMBOL,
+                        "ticker": channel_registry.get_ticker(source),
                         "action": "sell",
                         "time": current_time,
                         "orderType": "stop",
                         "stopPrice": str(stop_price),
                         "quantityType": "fixed_quantity"
                     }
-                    order_executor.send_webhook(stop_webhook_payload, config.WEBHOOK_URL, remaining_webhook_qty, "1/8 trim stop order webhook")
-                    print(f"Stop order placed after 1/8 trim at {stop_price} (3 points below entry {entry_price}) for {remaining_webhook_qty} contract(s)")
+                    order_executor.send_webhook_to_multiple_urls(stop_webhook_payload, channel_registry.get_webhook_urls(source), "1/8 trim stop order webhook", remaining_webhook_qty)
+                    log.info("Stop order placed after 1/8 trim at %s (%s points below entry %s) for %s contract(s)", stop_price, config.STOP_OFFSET_POINTS, entry_price, remaining_webhook_qty)
             
     except Exception as e:
-        print(f"Error submitting close orders: {e}")
+        log.error("Error submitting close orders: %s", e)
 
-def handle_stopped_message():
-    print("Stopped message received - calling flat and cancel methods")
+@latency_metrics.timed("handler", handler="stopped")
+def handle_stopped_message(source="discord_message"):
+    log.info("Stopped message received - calling flat and cancel methods")
     
     try:
-        print("Would call flatten_and_cancel methods")
+        log.info("Would call flatten_and_cancel methods")
         
-        if position_tracker.has_open_order():
-            position_tracker.clear_open_order()
-            print("Open order cleared")
+        key = position_tracker.position_key(channel_registry.get_ticker(source), source)
+        # The exit flattens the ticker at the receiver, which may be another book's position when this one is flat
+        if not position_tracker.has_open_order(key):
+            log.info("No open order for %s, skipping exit", source)
+            return
+        position_tracker.clear_open_order(key, "stop")
+        log.info("Open order cleared")
         
         webhook_payload = {
-            "ticker": config.TICKER_SYMBOL,
+            "ticker": channel_registry.get_ticker(source),
             "action": "exit",
             "orderType": "market",
         }
         
-        order_executor.send_webhook(webhook_payload, config.WEBHOOK_URL, config.GLOBAL_QUANTITY, "Stopped webhook")
+        order_executor.send_webhook_to_multiple_urls(webhook_payload, channel_registry.get_webhook_urls(source), "Stopped webhook", config.GLOBAL_QUANTITY)
         
-        print("Stopped message handling completed")
+        log.info("Stopped message handling completed")
         
     except Exception as e:
-        print(f"Error handling stopped message: {e}")
+        log.error("Error handling stopped message: %s", e)
 
+@latency_metrics.timed("handler", handler="es_order")
+def handle_es_order_message(match, content, source="discord_message"):
+    if position_tracker.has_open_order(position_tracker.position_key(channel_registry.get_ticker(source), source)):
+        log.info("Order already open, skipping new order submission")
+        return
+        
+    log.info("Matched ES order message", content=content)
+    
+    order_direction = match.group(1).lower()
+    long_value = match.group(2)
+    
+    if match.group(3):
+        letter = match.group(3).upper()
+    elif match.group(4):
+        letter = 'R'
+    else:
+        log.warning("Could not extract letter from message")
+        return
+    
+    stop_value = match.group(5)
+    
+    log.debug("Retrieved values: ES %s: %s, Letter: %s, Stop: %s", order_direction, long_value, letter, stop_value)
+    
+    order_type = 1
+    if order_direction == "long":
+        is_buy = True
+    else:
+        is_buy = False
+    
+    if letter not in config.LETTER_WEBHOOK_QUANTITIES:
+        allowed = ", ".join(f"'{key}'" for key in config.LETTER_WEBHOOK_QUANTITIES)
+        log.info("Ignoring order with letter '%s' - only %s orders are processed", letter, allowed)
+        return
+    personal_qty = config.GLOBAL_QUANTITY
+    webhook_qty = config.LETTER_WEBHOOK_QUANTITIES[letter]
+    
+    try:
+        result1 = "SIMULATED_ORDER_RESULT"
+        log.info("Would submit order from Discord message: is_buy=%s, qty=%s, order_type=%s", is_buy, personal_qty, order_type, result=result1)
+        
+        order_info = {
+            "action": "buy" if is_buy else "sell",
+            "direction": order_direction,
+            "ticker": channel_registry.get_ticker(source),
+            "letter": letter,
+            "stop_value": stop_value,
+            "order_type": order_type,
+            "source": source,
+            "quantities": {
+                "personal": personal_qty,
+                "webhook": webhook_qty
+            },
+            "results": [
+                str(result1) if result1 else None
+            ]
+        }
+        if not position_tracker.open_if_flat(order_info, "entry", shares_receiver(source)):
+            log.info("Order already open, skipping new order submission")
+            return
+        log.info("Order saved locally")
+        
+        if webhook_qty > 0:
+            webhook_payload = {
+                "ticker": channel_registry.get_ticker(source),
+                "price": str(long_value),
+                "action": "buy" if is_buy else "exit",
+                "orderType": "market",
+                "quantity": str(webhook_qty)
+            }
+            
+            additional_context = {
+                "source": source,
+                "direction": order_direction,
+                "letter": letter,
+                "stop_value": stop_value
+            }
+            
+            order_executor.send_cancel_and_enter(channel_registry.get_ticker(source), webhook_payload, channel_registry.get_webhook_urls(source), "Discord message webhook", webhook_qty, is_entry_trade=is_buy, additional_context=additional_context)
+        else:
+            log.warning("Skipping webhook submission - quantity is %s (must be > 0)", webhook_qty)
+        
+    except Exception as e:
+        log.error("Error submitting order: %s", e)
+
+@latency_metrics.timed("handler", handler="long_triggered")
 def handle_long_triggered_message(triggered_match, source="second_channel"):
-    if position_tracker.has_open_order():
-        print("Order already open, skipping new order submission")
+    if position_tracker.has_open_order(position_tracker.position_key(channel_registry.get_ticker(source), source)):
+        log.info("Order already open, skipping new order submission")
         return
     
-    print(f"Long Triggered message received from {source}")
+    log.info("Long Triggered message received from %s", source)
     
-    ticker = config.TICKER_SYMBOL
+    ticker = channel_registry.get_ticker(source)
     interval = int(triggered_match.group(2))
     level = float(triggered_match.group(3))
     score = triggered_match.group(4)
     price = float(triggered_match.group(5))
     time_str = triggered_match.group(6)
     
-    print(f"Parsed values: Ticker={ticker}, Interval={interval}, Level={level}, Score={score}, Price={price}, Time={time_str}")
+    log.debug("Parsed values: Ticker=%s, Interval=%s, Level=%s, Score=%s, Price=%s, Time=%s", ticker, interval, level, score, price, time_str)
     
     is_buy = True
     order_type = 1
@@ -139,22 +242,22 @@ def handle_long_triggered_message(triggered_match, source="second_channel"):
         score_max = int(score_parts[1])
         
         if source == "second_channel":
-            if score_value < 5:
-                print(f"Score {score_value} is below minimum threshold of 5 for second channel, skipping trade")
+            if score_value < config.MIN_SIGNAL_SCORE:
+                log.info("Score %s is below minimum threshold of %s for second channel, skipping trade", score_value, config.MIN_SIGNAL_SCORE)
                 return
         else:
-            if score_value < 5:
-                print(f"Score {score_value} is not greater than 5 for FBD endpoint, skipping trade")
+            if score_value < config.MIN_SIGNAL_SCORE:
+                log.info("Score %s is not greater than %s for FBD endpoint, skipping trade", score_value, config.MIN_SIGNAL_SCORE)
                 return
         
         personal_qty = min(15, max(5, score_value * 2))
     else:
-        print(f"Invalid score format: {score}, skipping trade")
+        log.warning("Invalid score format: %s, skipping trade", score)
         return
     
     try:
         result1 = "SIMULATED_ORDER_RESULT"
-        print(f"Would submit personal order: qty={personal_qty}, is_buy={is_buy}, order_type={order_type}")
+        log.info("Would submit personal order: qty=%s, is_buy=%s, order_type=%s", personal_qty, is_buy, order_type)
         webhook_qty = config.GLOBAL_QUANTITY
         order_info = {
             "action": "buy",
@@ -175,13 +278,13 @@ def handle_long_triggered_message(triggered_match, source="second_channel"):
                 str(result1) if result1 else None
             ]
         }
-        position_tracker.save_open_order(order_info)
-        print("Order saved locally")
+        if not position_tracker.open_if_flat(order_info, "entry", shares_receiver(source)):
+            log.info("Order already open, skipping new order submission")
+            return
+        log.info("Order saved locally")
         
         
         if webhook_qty > 0:
-            order_executor.send_cancel_webhook(ticker, config.WEBHOOK_URL)
-            
             webhook_payload = {
                 "ticker": ticker,
                 "price": str(price),
@@ -197,21 +300,23 @@ def handle_long_triggered_message(triggered_match, source="second_channel"):
                 "interval": interval
             }
             
-            order_executor.send_webhook(webhook_payload, config.WEBHOOK_URL, webhook_qty, "Long Triggered webhook", is_entry_trade=True, additional_context=additional_context)
+            order_executor.send_cancel_and_enter(ticker, webhook_payload, channel_registry.get_webhook_urls(source), "Long Triggered webhook", webhook_qty, is_entry_trade=True, additional_context=additional_context)
         else:
-            print(f"Skipping webhook submission - quantity is {webhook_qty} (must be > 0)")
+            log.warning("Skipping webhook submission - quantity is %s (must be > 0)", webhook_qty)
         
     except Exception as e:
-        print(f"Error submitting Long Triggered order: {e}")
+        log.error("Error submitting Long Triggered order: %s", e)
 
+@latency_metrics.timed("handler", handler="target_hit")
 def handle_target_hit_message(target_match, source="fbd_endpoint"):
-    if not position_tracker.has_open_order():
-        print("No open order to close for target hit")
+    key = position_tracker.position_key(channel_registry.get_ticker(source), source)
+    if not position_tracker.has_open_order(key):
+        log.info("No open order to close for target hit")
         return
     
-    print("Target 1 Hit message received - closing position")
+    log.info("Target 1 Hit message received - closing position")
     
-    ticker = config.TICKER_SYMBOL
+    ticker = channel_registry.get_ticker(source)
     interval = int(target_match.group(2))
     level = float(target_match.group(3))
     target_price = float(target_match.group(4))
@@ -219,7 +324,7 @@ def handle_target_hit_message(target_match, source="fbd_endpoint"):
     profit = float(target_match.group(6))
     time_str = target_match.group(7)
     
-    print(f"Parsed target hit values: Ticker={ticker}, Interval={interval}, Level={level}, Target={target_price}, Entry={entry_price}, Profit={profit}, Time={time_str}")
+    log.debug("Parsed target hit values: Ticker=%s, Interval=%s, Level=%s, Target=%s, Entry=%s, Profit=%s, Time=%s", ticker, interval, level, target_price, entry_price, profit, time_str)
 
     message_id = message_parser.create_message_id(ticker, target_price, entry_price, profit, time_str)
     
@@ -227,14 +332,9 @@ def handle_target_hit_message(target_match, source="fbd_endpoint"):
         return
     
     try:
-        order_info = position_tracker.get_open_order_info()
+        order_info = position_tracker.get_open_order_info(key)
         if not order_info:
-            print("Could not retrieve order info for target hit")
-            return
-        
-        order_source = order_info["order_info"].get("source", "unknown")
-        if order_source != source:
-            print(f"Target 1 hit message ignored - order source is '{order_source}', only processing {source} orders")
+            log.warning("Could not retrieve order info for target hit")
             return
         
         original_action = order_info["order_info"]["action"]
@@ -247,7 +347,7 @@ def handle_target_hit_message(target_match, source="fbd_endpoint"):
         webhook_close_qty = int(webhook_total_qty / 2)
         remaining_webhook_qty = webhook_total_qty - webhook_close_qty
         
-        print(f"Target 1 hit: Closing {webhook_close_qty} of {webhook_total_qty} webhook contracts, remaining: {remaining_webhook_qty}")
+        log.info("Target 1 hit: Closing %s of %s webhook contracts, remaining: %s", webhook_close_qty, webhook_total_qty, remaining_webhook_qty)
         
         if webhook_close_qty >= 1:
             webhook_payload = {
@@ -257,12 +357,12 @@ def handle_target_hit_message(target_match, source="fbd_endpoint"):
                 "orderType": "market"
             }
             
-            order_executor.send_webhook(webhook_payload, config.WEBHOOK_URL, webhook_close_qty, "Target hit close webhook")
+            order_executor.send_webhook_to_multiple_urls(webhook_payload, channel_registry.get_webhook_urls(source), "Target hit close webhook", webhook_close_qty)
         else:
-            print(f"Skipping webhook submission - quantity is {webhook_close_qty} (must be >= 1)")
+            log.warning("Skipping webhook submission - quantity is %s (must be >= 1)", webhook_close_qty)
         
         if remaining_webhook_qty >= 1:
-            stop_price = entry_price - 3.0
+            stop_price = entry_price - config.STOP_OFFSET_POINTS
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
             
             stop_webhook_payload = {
@@ -274,8 +374,8 @@ def handle_target_hit_message(target_match, source="fbd_endpoint"):
                 "quantityType": "fixed_quantity"
             }
             
-            order_executor.send_webhook(stop_webhook_payload, config.WEBHOOK_URL, remaining_webhook_qty, "Target hit stop order webhook")
-            print(f"Stop order placed at {stop_price} (3 points below entry {entry_price}) for {remaining_webhook_qty} contract(s)")
+            order_executor.send_webhook_to_multiple_urls(stop_webhook_payload, channel_registry.get_webhook_urls(source), "Target hit stop order webhook", remaining_webhook_qty)
+            log.info("Stop order placed at %s (%s points below entry %s) for %s contract(s)", stop_price, config.STOP_OFFSET_POINTS, entry_price, remaining_webhook_qty)
             
             remaining_quantities = {
                 "personal": original_quantities.get("personal", 0),
@@ -283,28 +383,30 @@ def handle_target_hit_message(target_match, source="fbd_endpoint"):
             }
             
             order_info["order_info"]["quantities"] = remaining_quantities
-            position_tracker.save_open_order(order_info["order_info"])
-            print(f"Order updated with remaining quantities: {remaining_quantities}")
+            position_tracker.save_open_order(order_info["order_info"], "trim")
+            log.info("Order updated with remaining quantities: %s", remaining_quantities)
         else:
-            print(f"Skipping stop order submission - quantity is {remaining_webhook_qty} (must be >= 1)")
-            position_tracker.clear_open_order()
-            print("Position fully closed due to target hit")
+            log.warning("Skipping stop order submission - quantity is %s (must be >= 1)", remaining_webhook_qty)
+            position_tracker.clear_open_order(key, "exit")
+            log.info("Position fully closed due to target hit")
         
-        print(f"Target 1 hit processed. Profit: {profit} pts")
+        log.info("Target 1 hit processed. Profit: %s pts", profit)
         
         message_parser.mark_message_processed(message_id)
         
     except Exception as e:
-        print(f"Error handling target hit message: {e}")
+        log.error("Error handling target hit message: %s", e)
 
+@latency_metrics.timed("handler", handler="target2_hit")
 def handle_target2_hit_message(target2_match, source="second_channel"):
-    if not position_tracker.has_open_order():
-        print("No open order to close for target 2 hit")
+    key = position_tracker.position_key(channel_registry.get_ticker(source), source)
+    if not position_tracker.has_open_order(key):
+        log.info("No open order to close for target 2 hit")
         return
     
-    print("Target 2 Hit message received - closing remaining position")
+    log.info("Target 2 Hit message received - closing remaining position")
     
-    ticker = config.TICKER_SYMBOL
+    ticker = channel_registry.get_ticker(source)
     interval = int(target2_match.group(2))
     level = float(target2_match.group(3))
     target_price = float(target2_match.group(4))
@@ -312,7 +414,7 @@ def handle_target2_hit_message(target2_match, source="second_channel"):
     profit = float(target2_match.group(6))
     time_str = target2_match.group(7)
     
-    print(f"Parsed target 2 hit values: Ticker={ticker}, Interval={interval}, Level={level}, Target={target_price}, Entry={entry_price}, Profit={profit}, Time={time_str}")
+    log.debug("Parsed target 2 hit values: Ticker=%s, Interval=%s, Level=%s, Target=%s, Entry=%s, Profit=%s, Time=%s", ticker, interval, level, target_price, entry_price, profit, time_str)
     
     message_id = message_parser.create_message_id(ticker, target_price, entry_price, profit, time_str)
     
@@ -320,14 +422,9 @@ def handle_target2_hit_message(target2_match, source="second_channel"):
         return
     
     try:
-        order_info = position_tracker.get_open_order_info()
+        order_info = position_tracker.get_open_order_info(key)
         if not order_info:
-            print("Could not retrieve order info for target 2 hit")
-            return
-        
-        order_source = order_info["order_info"].get("source", "unknown")
-        if order_source != source:
-            print(f"Target 2 hit message ignored - order source is '{order_source}', only processing {source} orders")
+            log.warning("Could not retrieve order info for target 2 hit")
             return
         
         original_action = order_info["order_info"]["action"]
@@ -343,26 +440,28 @@ def handle_target2_hit_message(target2_match, source="second_channel"):
                 "orderType": "market"
             }
             
-            order_executor.send_webhook(webhook_payload, config.WEBHOOK_URL, webhook_close_qty, "Target 2 close webhook")
+            order_executor.send_webhook_to_multiple_urls(webhook_payload, channel_registry.get_webhook_urls(source), "Target 2 close webhook", webhook_close_qty)
         else:
-            print(f"Skipping webhook submission - quantity is {webhook_close_qty} (must be > 0)")
+            log.warning("Skipping webhook submission - quantity is %s (must be > 0)", webhook_close_qty)
         
-        position_tracker.clear_open_order()
-        print(f"Remaining position closed due to target 2 hit. Profit: {profit} pts")
+        position_tracker.clear_open_order(key, "exit")
+        log.info("Remaining position closed due to target 2 hit. Profit: %s pts", profit)
         
         message_parser.mark_message_processed(message_id)
         
     except Exception as e:
-        print(f"Error handling target 2 hit message: {e}")
+        log.error("Error handling target 2 hit message: %s", e)
 
+@latency_metrics.timed("handler", handler="stop_loss")
 def handle_stop_loss_message(stop_loss_match, source="fbd_endpoint"):
-    if not position_tracker.has_open_order():
-        print("No open order to close for stop loss hit")
+    key = position_tracker.position_key(channel_registry.get_ticker(source), source)
+    if not position_tracker.has_open_order(key):
+        log.info("No open order to close for stop loss hit")
         return
     
-    print("Stop Loss Hit message received - closing position")
+    log.info("Stop Loss Hit message received - closing position")
     
-    ticker = config.TICKER_SYMBOL
+    ticker = channel_registry.get_ticker(source)
     interval = int(stop_loss_match.group(2))
     level = float(stop_loss_match.group(3))
     entry_price = float(stop_loss_match.group(4))
@@ -370,23 +469,18 @@ def handle_stop_loss_message(stop_loss_match, source="fbd_endpoint"):
     loss = float(stop_loss_match.group(6))
     time_str = stop_loss_match.group(7)
     
-    print(f"Parsed stop loss values: Ticker={ticker}, Interval={interval}, Level={level}, Entry={entry_price}, Exit={exit_price}, Loss={loss}, Time={time_str}")
+    log.debug("Parsed stop loss values: Ticker=%s, Interval=%s, Level=%s, Entry=%s, Exit=%s, Loss=%s, Time=%s", ticker, interval, level, entry_price, exit_price, loss, time_str)
     
     message_id = message_parser.create_message_id(ticker, exit_price, entry_price, loss, time_str)
     
     if message_parser.is_message_processed(message_id):
-        print(f"Stop loss message already processed (ID: {message_id}), skipping duplicate")
+        log.debug("Stop loss message already processed (ID: %s), skipping duplicate", message_id)
         return
     
     try:
-        order_info = position_tracker.get_open_order_info()
+        order_info = position_tracker.get_open_order_info(key)
         if not order_info:
-            print("Could not retrieve order info for stop loss hit")
-            return
-        
-        order_source = order_info["order_info"].get("source", "unknown")
-        if order_source != source:
-            print(f"Stop loss message ignored - order source is '{order_source}', only processing {source} orders")
+            log.warning("Could not retrieve order info for stop loss hit")
             return
         
         original_action = order_info["order_info"]["action"]
@@ -402,26 +496,28 @@ def handle_stop_loss_message(stop_loss_match, source="fbd_endpoint"):
                 "orderType": "market"
             }
             
-            order_executor.send_webhook(webhook_payload, config.WEBHOOK_URL, webhook_close_qty, "Stop loss close webhook")
+            order_executor.send_webhook_to_multiple_urls(webhook_payload, channel_registry.get_webhook_urls(source), "Stop loss close webhook", webhook_close_qty)
         else:
-            print(f"Skipping webhook submission - quantity is {webhook_close_qty} (must be > 0)")
+            log.warning("Skipping webhook submission - quantity is %s (must be > 0)", webhook_close_qty)
         
-        position_tracker.clear_open_order()
-        print(f"Position closed due to stop loss hit. Loss: {loss} pts")
+        position_tracker.clear_open_order(key, "stop")
+        log.info("Position closed due to stop loss hit. Loss: %s pts", loss)
         
         message_parser.mark_message_processed(message_id)
         
     except Exception as e:
-        print(f"Error handling stop loss message: {e}")
+        log.error("Error handling stop loss message: %s", e)
 
+@latency_metrics.timed("handler", handler="stop_loss_simple")
 def handle_stop_loss_simple_message(stop_loss_match, source="second_channel"):
-    if not position_tracker.has_open_order():
-        print("No open order to close for stop loss hit")
+    key = position_tracker.position_key(channel_registry.get_ticker(source), source)
+    if not position_tracker.has_open_order(key):
+        log.info("No open order to close for stop loss hit")
         return
     
-    print("Stop Loss message received - closing position")
+    log.info("Stop Loss message received - closing position")
     
-    ticker = config.TICKER_SYMBOL
+    ticker = channel_registry.get_ticker(source)
     interval = int(stop_loss_match.group(2))
     level = float(stop_loss_match.group(3))
     entry_price = float(stop_loss_match.group(4))
@@ -429,7 +525,7 @@ def handle_stop_loss_simple_message(stop_loss_match, source="second_channel"):
     loss = float(stop_loss_match.group(6))
     time_str = datetime.now().isoformat()
     
-    print(f"Parsed stop loss values: Ticker={ticker}, Interval={interval}, Level={level}, Entry={entry_price}, Exit={exit_price}, Loss={loss}")
+    log.debug("Parsed stop loss values: Ticker=%s, Interval=%s, Level=%s, Entry=%s, Exit=%s, Loss=%s", ticker, interval, level, entry_price, exit_price, loss)
     
     message_id = message_parser.create_message_id(ticker, exit_price, entry_price, loss, time_str)
     
@@ -437,14 +533,9 @@ def handle_stop_loss_simple_message(stop_loss_match, source="second_channel"):
         return
     
     try:
-        order_info = position_tracker.get_open_order_info()
+        order_info = position_tracker.get_open_order_info(key)
         if not order_info:
-            print("Could not retrieve order info for stop loss hit")
-            return
-        
-        order_source = order_info["order_info"].get("source", "unknown")
-        if order_source != source:
-            print(f"Stop loss message ignored - order source is '{order_source}', only processing {source} orders")
+            log.warning("Could not retrieve order info for stop loss hit")
             return
         
         original_action = order_info["order_info"]["action"]
@@ -460,53 +551,62 @@ def handle_stop_loss_simple_message(stop_loss_match, source="second_channel"):
                 "orderType": "market"
             }
             
-            order_executor.send_webhook(webhook_payload, config.WEBHOOK_URL, webhook_close_qty, "Stop loss close webhook")
+            order_executor.send_webhook_to_multiple_urls(webhook_payload, channel_registry.get_webhook_urls(source), "Stop loss close webhook", webhook_close_qty)
         else:
-            print(f"Skipping webhook submission - quantity is {webhook_close_qty} (must be > 0)")
+            log.warning("Skipping webhook submission - quantity is %s (must be > 0)", webhook_close_qty)
         
-        position_tracker.clear_open_order()
-        print(f"Position closed due to stop loss hit. Loss: {loss} pts")
+        position_tracker.clear_open_order(key, "stop")
+        log.info("Position closed due to stop loss hit. Loss: %s pts", loss)
         
         message_parser.mark_message_processed(message_id)
         
     except Exception as e:
-        print(f"Error handling stop loss message: {e}")
+        log.error("Error handling stop loss message: %s", e)
 
-def check_last_message():
-    if not is_weekday():
-        return
-    
+def shares_receiver(source):
+    # Two books on one ticker and one receiver are one account position there: a cancel or exit sent
+    # for either would flatten the other, so an entry waits until the other book is flat
+    urls = set(channel_registry.get_webhook_urls(source))
+    return lambda key: key[1] != source and not urls.isdisjoint(channel_registry.get_webhook_urls(key[1]))
+
+def run_for_position(source, handler, *args, **kwargs):
+    # Every transition of one position runs on that position's actor, one at a time, and the
+    # orders it produces leave together when batching is enabled
+    key = position_tracker.position_key(channel_registry.get_ticker(source), source)
+    return position_actor.run(key, order_executor.run_batched, handler, *args, **kwargs)
+
+def process_discord_message(msg, source="discord_message"):
     try:
-        position_tracker.reset_orders_if_expired()
-        
-        msg = discord_scraper.fetch_last_message()
-        if not msg:
-            print("No messages found.")
+        msg_id = msg.get("id")
+        edited_timestamp = msg.get("edited_timestamp")
+        if message_parser.get_cached_classification(msg_id, edited_timestamp) is not None:
             return
 
+        latency_metrics.start_signal(msg, source)
+        event_log.start_signal(msg_id, source)
         content = msg.get("content", "")
         mention_everyone = msg.get("mention_everyone", False)
-        msg_id = msg.get("id")
 
-        stopped_match = message_parser.parse_stopped_message(content)
-        if mention_everyone and stopped_match:
+        with latency_metrics.timer("parse", channel=source):
+            signal_type, match = message_parser.classify_message(msg_id, edited_timestamp, content, message_parser.CONTENT_RULES)
+
+        if mention_everyone and signal_type == message_parser.SIGNAL_STOPPED:
             if msg_id and discord_scraper.is_discord_message_processed(msg_id):
                 return
             
-            handle_stopped_message()
+            run_for_position(source, handle_stopped_message, source)
             if msg_id:
                 discord_scraper.mark_discord_message_processed(msg_id)
             return
 
-        trim_match = message_parser.parse_trim_message(content)
-        if mention_everyone and trim_match:
+        if mention_everyone and signal_type == message_parser.SIGNAL_TRIM:
             msg_id = msg.get("id")
             if msg_id and discord_scraper.is_discord_message_processed(msg_id):
-                print(f"Trim message already processed (Discord message ID: {msg_id}), skipping duplicate")
+                log.debug("Trim message already processed (Discord message ID: %s), skipping duplicate", msg_id)
                 return
             
-            numerator = int(trim_match.group(1))
-            denominator = int(trim_match.group(2))
+            numerator = int(match.group(1))
+            denominator = int(match.group(2))
             time_str = msg.get("timestamp", datetime.now().isoformat())
             message_id = message_parser.create_message_id("trim", numerator, denominator, 0, time_str)
             
@@ -515,128 +615,31 @@ def check_last_message():
                     discord_scraper.mark_discord_message_processed(msg_id)
                 return
             
-            handle_trim_message(trim_match)
+            run_for_position(source, handle_trim_message, match, source)
             if msg_id:
                 discord_scraper.mark_discord_message_processed(msg_id)
             message_parser.mark_message_processed(message_id)
             return
 
-        match = message_parser.parse_es_order_message(content)
-        if mention_everyone and match:
-            if position_tracker.has_open_order():
-                print("Order already open, skipping new order submission")
-                return
-                
-            print("Matched message:")
-            print(content)
-            
-            order_direction = match.group(1).lower()
-            long_value = match.group(2)
-            
-            if match.group(3):
-                letter = match.group(3).upper()
-            elif match.group(4):
-                letter = 'R'
-            else:
-                print("Could not extract letter from message")
-                return
-            
-            stop_value = match.group(5)
-            
-            print(f"Retrieved values: ES {order_direction}: {long_value}, Letter: {letter}, Stop: {stop_value}")
-            
-            order_type = 1
-            if order_direction == "long":
-                is_buy = True
-            else:
-                is_buy = False
-            
-            if letter == 'A':
-                personal_qty = config.GLOBAL_QUANTITY
-                webhook_qty = config.GLOBAL_QUANTITY
-            elif letter == 'B':
-                personal_qty = config.GLOBAL_QUANTITY
-                webhook_qty = 8
-            elif letter == 'C':
-                personal_qty = config.GLOBAL_QUANTITY
-                webhook_qty = 5
-            elif letter == 'R':
-                personal_qty = config.GLOBAL_QUANTITY
-                webhook_qty = config.GLOBAL_QUANTITY
-            else:
-                print(f"Ignoring order with letter '{letter}' - only 'A', 'B', 'C', 'R' orders are processed")
-                return
-            
-            try:
-                result1 = "SIMULATED_ORDER_RESULT"
-                print(f"Would submit order from Discord message: is_buy={is_buy}, qty={personal_qty}, order_type={order_type}")
-                print(result1)
-                
-                order_info = {
-                    "action": "buy" if is_buy else "sell",
-                    "direction": order_direction,
-                    "ticker": config.TICKER_SYMBOL,
-                    "letter": letter,
-                    "stop_value": stop_value,
-                    "order_type": order_type,
-                    "source": "discord_message",
-                    "quantities": {
-                        "personal": personal_qty,
-                        "webhook": webhook_qty
-                    },
-                    "results": [
-                        str(result1) if result1 else None
-                    ]
-                }
-                position_tracker.save_open_order(order_info)
-                print("Order saved locally")
-                
-                if webhook_qty > 0:
-                    order_executor.send_cancel_webhook(config.TICKER_SYMBOL, config.WEBHOOK_URL)
-                    
-                    webhook_payload = {
-                        "ticker": config.TICKER_SYMBOL,
-                        "price": str(long_value),
-                        "action": "buy" if is_buy else "exit",
-                        "orderType": "market",
-                        "quantity": str(webhook_qty)
-                    }
-                    
-                    additional_context = {
-                        "source": "discord_message",
-                        "direction": order_direction,
-                        "letter": letter,
-                        "stop_value": stop_value
-                    }
-                    
-                    order_executor.send_webhook(webhook_payload, config.WEBHOOK_URL, webhook_qty, "Discord message webhook", is_entry_trade=is_buy, additional_context=additional_context)
-                else:
-                    print(f"Skipping webhook submission - quantity is {webhook_qty} (must be > 0)")
-                
-            except Exception as e:
-                print(f"Error submitting order: {e}")
+        if mention_everyone and signal_type == message_parser.SIGNAL_ES_ORDER:
+            run_for_position(source, handle_es_order_message, match, content, source)
         else:
             if not discord_scraper.is_invalid_message_logged(msg_id, content):
-                print(content)
+                log.debug("Unmatched message", content=content)
                 discord_scraper.mark_invalid_message_logged(msg_id, content)
 
     except Exception as e:
-        print(f"Error: {e}")
+        log.error("Error processing message %s: %s", msg.get('id'), e, exc_info=True)
 
-def check_second_channel():
-    if not is_weekday():
-        return
-    
+def process_second_channel_message(msg, source="second_channel"):
     try:
-        messages = discord_scraper.fetch_second_channel_messages()
-       
-        if not messages:
-            print("No messages found in second channel")
-            return
-
-        msg = messages[0]
         msg_id = msg.get("id")
+        edited_timestamp = msg.get("edited_timestamp")
+        if message_parser.get_cached_classification(msg_id, edited_timestamp) is not None:
+            return
        
+        latency_metrics.start_signal(msg, source)
+        event_log.start_signal(msg_id, source)
         embeds = msg.get("embeds", [])
        
         embed_content = ""
@@ -644,27 +647,28 @@ def check_second_channel():
         if embeds and len(embeds) > 0:
             embed_content = embeds[0].get("description", "")
         
-        stopped_match = message_parser.parse_stopped_message(embed_content)
-        if stopped_match:
+        with latency_metrics.timer("parse", channel=source):
+            signal_type, match = message_parser.classify_message(msg_id, edited_timestamp, embed_content, message_parser.EMBED_RULES)
+
+        if signal_type == message_parser.SIGNAL_STOPPED:
             if msg_id and discord_scraper.is_discord_message_processed(msg_id):
                 return
             
-            print("Stopped message found in second channel:")
-            handle_stopped_message()
+            log.info("Stopped message found in second channel")
+            run_for_position(source, handle_stopped_message, source)
             if msg_id:
                 discord_scraper.mark_discord_message_processed(msg_id)
             return
         
-        target_hit_match = message_parser.parse_target_hit_message(embed_content)
-        if target_hit_match:
+        if signal_type == message_parser.SIGNAL_TARGET_HIT:
             if msg_id and discord_scraper.is_discord_message_processed(msg_id):
                 return
             
-            ticker = config.TICKER_SYMBOL
-            target_price = float(target_hit_match.group(4))
-            entry_price = float(target_hit_match.group(5))
-            profit = float(target_hit_match.group(6))
-            time_str = target_hit_match.group(7)
+            ticker = channel_registry.get_ticker(source)
+            target_price = float(match.group(4))
+            entry_price = float(match.group(5))
+            profit = float(match.group(6))
+            time_str = match.group(7)
             message_id = message_parser.create_message_id(ticker, target_price, entry_price, profit, time_str)
             
             if message_parser.is_message_processed(message_id):
@@ -672,22 +676,21 @@ def check_second_channel():
                     discord_scraper.mark_discord_message_processed(msg_id)
                 return
             
-            print("Target 1 Hit message found in second channel:")
-            handle_target_hit_message(target_hit_match, source="second_channel")
+            log.info("Target 1 Hit message found in second channel")
+            run_for_position(source, handle_target_hit_message, match, source)
             if msg_id:
                 discord_scraper.mark_discord_message_processed(msg_id)
             return
         
-        target2_hit_match = message_parser.parse_target2_hit_message(embed_content)
-        if target2_hit_match:
+        if signal_type == message_parser.SIGNAL_TARGET2_HIT:
             if msg_id and discord_scraper.is_discord_message_processed(msg_id):
                 return
             
-            ticker = config.TICKER_SYMBOL
-            target_price = float(target2_hit_match.group(4))
-            entry_price = float(target2_hit_match.group(5))
-            profit = float(target2_hit_match.group(6))
-            time_str = target2_hit_match.group(7)
+            ticker = channel_registry.get_ticker(source)
+            target_price = float(match.group(4))
+            entry_price = float(match.group(5))
+            profit = float(match.group(6))
+            time_str = match.group(7)
             message_id = message_parser.create_message_id(ticker, target_price, entry_price, profit, time_str)
             
             if message_parser.is_message_processed(message_id):
@@ -695,23 +698,22 @@ def check_second_channel():
                     discord_scraper.mark_discord_message_processed(msg_id)
                 return
             
-            print("Target 2 Hit message found in second channel:")
-            handle_target2_hit_message(target2_hit_match, source="second_channel")
+            log.info("Target 2 Hit message found in second channel")
+            run_for_position(source, handle_target2_hit_message, match, source)
             if msg_id:
                 discord_scraper.mark_discord_message_processed(msg_id)
             return
         
-        stop_loss_match = message_parser.parse_stop_loss_message(embed_content)
-        if stop_loss_match:
+        if signal_type == message_parser.SIGNAL_STOP_LOSS:
             if msg_id and discord_scraper.is_discord_message_processed(msg_id):
-                print(f"Stop Loss Hit message already processed (Discord message ID: {msg_id}), skipping duplicate")
+                log.debug("Stop Loss Hit message already processed (Discord message ID: %s), skipping duplicate", msg_id)
                 return
             
-            ticker = config.TICKER_SYMBOL
-            entry_price = float(stop_loss_match.group(4))
-            exit_price = float(stop_loss_match.group(5))
-            loss = float(stop_loss_match.group(6))
-            time_str = stop_loss_match.group(7)
+            ticker = channel_registry.get_ticker(source)
+            entry_price = float(match.group(4))
+            exit_price = float(match.group(5))
+            loss = float(match.group(6))
+            time_str = match.group(7)
             message_id = message_parser.create_message_id(ticker, exit_price, entry_price, loss, time_str)
             
             if message_parser.is_message_processed(message_id):
@@ -719,21 +721,20 @@ def check_second_channel():
                     discord_scraper.mark_discord_message_processed(msg_id)
                 return
             
-            print("Stop Loss Hit message found in second channel:")
-            handle_stop_loss_message(stop_loss_match, source="second_channel")
+            log.info("Stop Loss Hit message found in second channel")
+            run_for_position(source, handle_stop_loss_message, match, source)
             if msg_id:
                 discord_scraper.mark_discord_message_processed(msg_id)
             return
         
-        stop_loss_simple_match = message_parser.parse_stop_loss_simple_message(embed_content)
-        if stop_loss_simple_match and "Loss:" in embed_content:
+        if signal_type == message_parser.SIGNAL_STOP_LOSS_SIMPLE:
             if msg_id and discord_scraper.is_discord_message_processed(msg_id):
                 return
             
-            ticker = config.TICKER_SYMBOL
-            entry_price = float(stop_loss_simple_match.group(4))
-            exit_price = float(stop_loss_simple_match.group(5))
-            loss = float(stop_loss_simple_match.group(6))
+            ticker = channel_registry.get_ticker(source)
+            entry_price = float(match.group(4))
+            exit_price = float(match.group(5))
+            loss = float(match.group(6))
             time_str = datetime.now().isoformat()
             message_id = message_parser.create_message_id(ticker, exit_price, entry_price, loss, time_str)
             
@@ -742,43 +743,136 @@ def check_second_channel():
                     discord_scraper.mark_discord_message_processed(msg_id)
                 return
             
-            print("Stop Loss message found in second channel (simple format):")
-            handle_stop_loss_simple_message(stop_loss_simple_match, source="second_channel")
+            log.info("Stop Loss message found in second channel (simple format)")
+            run_for_position(source, handle_stop_loss_simple_message, match, source)
             if msg_id:
                 discord_scraper.mark_discord_message_processed(msg_id)
             return
         
-        triggered_match = message_parser.parse_long_triggered_message(embed_content)
-        if triggered_match:
+        if signal_type == message_parser.SIGNAL_LONG_TRIGGERED:
             if msg_id and discord_scraper.is_discord_message_processed(msg_id):
-                print(f"Long Triggered message already processed (Discord message ID: {msg_id}), skipping duplicate")
+                log.debug("Long Triggered message already processed (Discord message ID: %s), skipping duplicate", msg_id)
                 return
             
-            ticker = config.TICKER_SYMBOL
-            interval = int(triggered_match.group(2))
-            level = float(triggered_match.group(3))
-            score = triggered_match.group(4)
-            price = float(triggered_match.group(5))
-            time_str = triggered_match.group(6)
+            ticker = channel_registry.get_ticker(source)
+            interval = int(match.group(2))
+            level = float(match.group(3))
+            score = match.group(4)
+            price = float(match.group(5))
+            time_str = match.group(6)
             message_id = message_parser.create_message_id(ticker, price, price, 0, time_str)
             
             if message_parser.is_message_processed(message_id):
-                print(f"Long Triggered message already processed (content ID: {message_id}), skipping duplicate")
+                log.debug("Long Triggered message already processed (content ID: %s), skipping duplicate", message_id)
                 if msg_id:
                     discord_scraper.mark_discord_message_processed(msg_id)
                 return
             
-            print("Long Triggered message found in second channel: " + datetime.now().isoformat())
-            handle_long_triggered_message(triggered_match, source="second_channel")
+            log.info("Long Triggered message found in second channel")
+            run_for_position(source, handle_long_triggered_message, match, source)
             if msg_id:
                 discord_scraper.mark_discord_message_processed(msg_id)
             return
 
     except Exception as e:
-        print(f"Error checking second channel: {e}")
+        log.error("Error processing second channel message %s: %s", msg.get('id'), e, exc_info=True)
+
+PROFILE_PROCESSORS = {
+    "content": process_discord_message,
+    "embed": process_second_channel_message,
+}
+
+# REST polls and gateway events can deliver the same message; each channel handles one at a time
+channel_locks = {}
+
+def is_new_signal(profile, msg):
+    msg_id = msg.get("id")
+    edited_timestamp = msg.get("edited_timestamp")
+    if message_parser.get_cached_classification(msg_id, edited_timestamp) is not None:
+        return False
+    text = message_parser.message_text(msg, profile)
+    signal_type, _ = message_parser.classify_message(msg_id, edited_timestamp, text, message_parser.PROFILE_RULES[profile])
+    if signal_type is None:
+        log.debug("Unmatched message", content=text, signal=msg_id)
+        return False
+    return True
+
+def handle_channel_message(name, msg):
+    channel = channel_registry.get_channel(name)
+    with channel_locks.setdefault(name, threading.Lock()):
+        if not supervisor.is_worker():
+            PROFILE_PROCESSORS[channel.profile](msg, source=name)
+        elif is_new_signal(channel.profile, msg):
+            # Shard workers only classify; the owner process handles the signal
+            supervisor.forward(name, msg)
+
+def check_channel(name):
+    channel = channel_registry.get_channel(name)
+    with latency_metrics.timer("poll", channel=name):
+        try:
+            if not supervisor.is_worker():
+                position_tracker.reset_orders_if_expired()
+
+            messages = discord_scraper.fetch_new_messages(channel.channel_id, channel.token, channel.api_version)
+            if messages is None:
+                return
+
+            # Only REST moves the cursor: a gateway event past a gap must not hide the gap from the
+            # reconcile poll, and whatever both paths deliver is dropped by the dedupe store
+            for msg in messages:
+                handle_channel_message(name, msg)
+                discord_scraper.advance_cursor(channel.channel_id, msg.get("id"))
+
+        except Exception as e:
+            log.error("Error checking channel %s: %s", name, e)
+
+def get_channel_checks(names):
+    return {name: functools.partial(check_channel, name) for name in names}
+
+def get_poll_delay(name: str) -> float:
+    channel = channel_registry.get_channel(name)
+    if gateway_client.is_connected(channel.token):
+        # Events arrive over the gateway; REST only reconciles anything missed around reconnects
+        return max(channel.min_poll_interval, config.GATEWAY_RECONCILE_INTERVAL_SECONDS)
+    position_open = supervisor.has_open_position(name) if supervisor.is_worker() else position_tracker.has_any_open_order(name)
+    delay = rate_limiter.next_poll_delay(channel.token, channel.channel_id, position_open)
+    return max(channel.min_poll_interval, delay)
+
+async def run_gateway(checks):
+    channels = {channel_registry.get_channel(name).channel_id: name for name in checks}
+    queues = {name: asyncio.Queue() for name in checks}
+
+    async def on_message(event_type, msg):
+        name = channels.get(msg.get("channel_id"))
+        if name and market_session.is_open():
+            queues[name].put_nowait(msg)
+
+    # One consumer per channel keeps messages in order without one channel waiting on another
+    async def consume(name):
+        while True:
+            msg = await queues[name].get()
+            await asyncio.to_thread(handle_channel_message, name, msg)
+
+    tokens = {channel_registry.get_channel(name).token for name in checks}
+    await asyncio.gather(
+        *(gateway_client.run(token, on_message) for token in tokens),
+        *(consume(name) for name in checks)
+    )
+
+async def run_channels(names):
+    checks = get_channel_checks(names)
+    tasks = [poller.run_pollers(checks, get_poll_delay)]
+    if config.INGESTION_MODE == "gateway" and checks:
+        tasks.append(run_gateway(checks))
+    await asyncio.gather(*tasks)
+
+async def run_bot():
+    if config.WORKER_PROCESSES > 1:
+        await supervisor.supervise(config.WORKER_PROCESSES, handle_channel_message, run_channels)
+    else:
+        await run_channels(list(channel_registry.get_channels()))
 
 if __name__ == "__main__":
-    while True:
-        check_last_message()
-        # check_second_channel()
-        time.sleep(1)
+    latency_metrics.start()
+    http_client.warm_up([*config.WEBHOOK_WARM_UP_URLS, f"{config.DISCORD_API_BASE}/v10/gateway"])
+    asyncio.run(run_bot())
@@ -0,0 +1,43 @@
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Tuple
+from zoneinfo import ZoneInfo
+import config
+
+# The bot follows the market Monday through Friday in MARKET_TIMEZONE. The next open/close
+# boundary is worked out once per transition and cached as epoch seconds, so checking the
+# session on the hot path is a float comparison.
+# (open, epoch seconds of the next transition)
+state: Tuple[bool, float] = (False, 0.0)
+
+def session_at(now: datetime) -> Tuple[bool, datetime]:
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if now.weekday() < 5:
+        # Open until Saturday 00:00
+        return True, midnight + timedelta(days=5 - now.weekday())
+    # Closed until Monday 00:00
+    return False, midnight + timedelta(days=7 - now.weekday())
+
+def refresh(now: float) -> Tuple[bool, float]:
+    global state
+    is_open, change = session_at(datetime.fromtimestamp(now, ZoneInfo(config.MARKET_TIMEZONE)))
+    state = (is_open, change.timestamp())
+    return state
+
+def current() -> Tuple[bool, float]:
+    now = time.time()
+    snapshot = state
+    if now >= snapshot[1]:
+        snapshot = refresh(now)
+    return snapshot
+
+def is_open() -> bool:
+    if config.SESSION_ALWAYS_OPEN:
+        return True
+    return current()[0]
+
+def seconds_until_change() -> float:
+    if config.SESSION_ALWAYS_OPEN:
+        return math.inf
+    return max(0.0, current()[1] - time.time())
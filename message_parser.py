@@ -1,18 +1,21 @@
 import re
-import hashlib
-from typing import Optional, Match
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Match, Tuple
 import config
+import dedupe_store
 
-processed_messages = set()
+processed_messages = dedupe_store.create_store("parsed_messages")
+classification_cache: "OrderedDict[str, Tuple[Optional[str], Optional[str], Optional[Match]]]" = OrderedDict()
+classification_cache_lock = threading.Lock()
 
-def create_message_id(ticker: str, target_price: float, entry_price: float, profit: float, time_str: str) -> str:
-    message_content = f"{ticker}_{target_price}_{entry_price}_{profit}_{time_str}"
-    return hashlib.md5(message_content.encode()).hexdigest()
+def create_message_id(ticker: str, target_price: float, entry_price: float, profit: float, time_str: str) -> int:
+    return dedupe_store.content_key(ticker, target_price, entry_price, profit, time_str)
 
-def is_message_processed(message_id: str) -> bool:
-    return message_id in processed_messages
+def is_message_processed(message_id: int) -> bool:
+    return processed_messages.contains(message_id)
 
-def mark_message_processed(message_id: str):
+def mark_message_processed(message_id: int):
     processed_messages.add(message_id)
 
 def parse_trim_message(content: str) -> Optional[Match]:
@@ -38,3 +41,83 @@ def parse_stop_loss_simple_message(content: str) -> Optional[Match]:
 
 def parse_es_order_message(content: str) -> Optional[Match]:
     return config.PATTERN.search(content)
+
+SIGNAL_STOPPED = "stopped"
+SIGNAL_TRIM = "trim"
+SIGNAL_ES_ORDER = "es_order"
+SIGNAL_TARGET_HIT = "target_hit"
+SIGNAL_TARGET2_HIT = "target2_hit"
+SIGNAL_STOP_LOSS = "stop_loss"
+SIGNAL_STOP_LOSS_SIMPLE = "stop_loss_simple"
+SIGNAL_LONG_TRIGGERED = "long_triggered"
+
+# Rules are tried in priority order. Each rule lists literal fragments that any match of its
+# pattern must contain (lowercased, since the patterns are case-insensitive) plus an optional
+# case-sensitive fragment, so a plain substring scan rules out everything but one regex.
+CONTENT_RULES = [
+    (SIGNAL_STOPPED, ("#alert stopped",), None, config.STOPPED_PATTERN),
+    (SIGNAL_TRIM, ("#alert trim ",), None, config.TRIM_PATTERN),
+    (SIGNAL_ES_ORDER, ("es long", "es short"), None, config.PATTERN),
+]
+
+EMBED_RULES = [
+    (SIGNAL_STOPPED, ("#alert stopped",), None, config.STOPPED_PATTERN),
+    (SIGNAL_TARGET_HIT, ("target 1: **",), None, config.TARGET_HIT_PATTERN),
+    (SIGNAL_TARGET2_HIT, ("target 2: **",), None, config.TARGET2_HIT_PATTERN),
+    (SIGNAL_STOP_LOSS, ("stop loss hit",), None, config.STOP_LOSS_PATTERN),
+    (SIGNAL_STOP_LOSS_SIMPLE, ("loss: **",), "Loss:", config.STOP_LOSS_SIMPLE_PATTERN),
+    (SIGNAL_LONG_TRIGGERED, ("score: **",), None, config.LONG_TRIGGERED_PATTERN),
+]
+
+# Channels are parsed by profile: message content, or the description of the first embed
+PROFILE_RULES = {"content": CONTENT_RULES, "embed": EMBED_RULES}
+
+def message_text(msg: Dict, profile: str) -> str:
+    if profile == "embed":
+        embeds = msg.get("embeds") or []
+        return embeds[0].get("description", "") if embeds else ""
+    return msg.get("content", "")
+
+def classify(content: str, rules) -> Tuple[Optional[str], Optional[Match]]:
+    if not content:
+        return None, None
+    
+    lowered = content.lower()
+    for signal_type, fragments, exact_fragment, pattern in rules:
+        for fragment in fragments:
+            if fragment in lowered:
+                break
+        else:
+            continue
+        if exact_fragment and exact_fragment not in content:
+            continue
+        match = pattern.search(content)
+        if match:
+            return signal_type, match
+    return None, None
+
+def classify_content_message(content: str) -> Tuple[Optional[str], Optional[Match]]:
+    return classify(content, CONTENT_RULES)
+
+def classify_embed_message(content: str) -> Tuple[Optional[str], Optional[Match]]:
+    return classify(content, EMBED_RULES)
+
+def get_cached_classification(msg_id: Optional[str], edited_timestamp: Optional[str]) -> Optional[Tuple[Optional[str], Optional[Match]]]:
+    if not msg_id:
+        return None
+    with classification_cache_lock:
+        cached = classification_cache.get(msg_id)
+        if cached is None or cached[0] != edited_timestamp:
+            return None
+        classification_cache.move_to_end(msg_id)
+        return cached[1], cached[2]
+
+def classify_message(msg_id: Optional[str], edited_timestamp: Optional[str], content: str, rules) -> Tuple[Optional[str], Optional[Match]]:
+    signal_type, match = classify(content, rules)
+    if msg_id:
+        with classification_cache_lock:
+            classification_cache[msg_id] = (edited_timestamp, signal_type, match)
+            classification_cache.move_to_end(msg_id)
+            while len(classification_cache) > config.CLASSIFICATION_CACHE_SIZE:
+                classification_cache.popitem(last=False)
+    return signal_type, match
@@ -0,0 +1,80 @@
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import config
+import event_log
+import http_client
+
+log = event_log.get_logger("notify")
+
+notification_queue: "queue.Queue[Tuple[str, str]]" = queue.Queue(maxsize=config.NOTIFY_QUEUE_SIZE)
+worker_thread: Optional[threading.Thread] = None
+worker_lock = threading.Lock()
+stats = {"enqueued": 0, "sent": 0, "coalesced": 0, "dropped": 0, "failed": 0}
+
+def ensure_worker():
+    global worker_thread
+    if worker_thread is not None:
+        return
+    with worker_lock:
+        if worker_thread is None:
+            worker_thread = threading.Thread(target=run_worker, name="ntfy-notifier", daemon=True)
+            worker_thread.start()
+
+def enqueue(title: str, message: str):
+    ensure_worker()
+    while True:
+        try:
+            notification_queue.put_nowait((title, message))
+            stats["enqueued"] += 1
+            return
+        except queue.Full:
+            # Under backpressure the oldest notification is the least useful one
+            try:
+                notification_queue.get_nowait()
+                stats["dropped"] += 1
+            except queue.Empty:
+                pass
+
+def drain_burst(first: Tuple[str, str]) -> List[Tuple[str, str]]:
+    burst = [first]
+    deadline = time.monotonic() + config.NOTIFY_COALESCE_SECONDS
+    while len(burst) < config.NOTIFY_MAX_BATCH:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            burst.append(notification_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return burst
+
+def post_notification(title: str, message: str, tags: str = "chart_with_upwards_trend"):
+    headers = {
+        "Title": title,
+        "Priority": "default",
+        "Tags": tags
+    }
+    http_client.post(config.NTFY_URL, data=message.encode("utf-8"), headers=headers, timeout=5)
+
+def run_worker():
+    while True:
+        burst = drain_burst(notification_queue.get())
+        if len(burst) == 1:
+            title, message = burst[0]
+        else:
+            title = f"{len(burst)} orders placed"
+            message = "\n\n".join(f"{item_title}\n{item_message}" for item_title, item_message in burst)
+            stats["coalesced"] += len(burst) - 1
+        
+        try:
+            post_notification(title, message)
+            stats["sent"] += 1
+            log.info("ntfy notification sent: %s", title)
+        except Exception as e:
+            stats["failed"] += 1
+            log.error("Error sending ntfy notification: %s", e)
+
+def get_stats() -> Dict[str, int]:
+    return {"depth": notification_queue.qsize(), **stats}
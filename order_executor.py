@@ -1,7 +1,26 @@
-import requests
+import contextvars
+import threading
 import time
-from typing import Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple, Union
 import config
+import event_log
+import http_client
+import latency_metrics
+import notifier
+import order_journal
+import retry_scheduler
+
+log = event_log.get_logger("webhook")
+
+fanout_executor = ThreadPoolExecutor(max_workers=config.WEBHOOK_FANOUT_WORKERS, thread_name_prefix="webhook-fanout")
+
+# Sequence numbers let the receiver restore submission order for requests sent concurrently.
+# Seeded from the clock so they keep increasing across restarts.
+sequence_lock = threading.Lock()
+last_sequence = time.time_ns() // 1000
 
 def send_ntfy_notification(payload: Dict, quantity: Optional[int], operation_name: str, additional_context: Optional[Dict] = None):
     try:
@@ -59,17 +78,239 @@ def send_ntfy_notification(payload: Dict, quantity: Optional[int], operation_nam
         
         message = "\n".join(message_parts)
         
-        ntfy_url = "https://ntfy.sh/fcpauldiaz_notifications"
-        headers = {
-            "Title": title,
-            "Priority": "default",
-            "Tags": "chart_with_upwards_trend"
-        }
-        
-        requests.post(ntfy_url, data=message.encode("utf-8"), headers=headers, timeout=5)
-        print(f"ntfy notification sent: {title}")
+        notifier.enqueue(title, message)
+    except Exception as e:
+        log.error("Error queueing ntfy notification: %s", e)
+
+@dataclass
+class WebhookResult:
+    url: str
+    operation_name: str
+    success: bool = False
+    pending: bool = False
+    status_code: Optional[int] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+def journal_ack(job: retry_scheduler.RetryJob):
+    event_type = "cancel" if job.payload.get("action") == "cancel" else "webhook_ack"
+    order_journal.append(event_type, url=job.url, operation=job.operation_name, payload=job.payload, attempts=job.attempts)
+
+def journal_failure(job: retry_scheduler.RetryJob):
+    order_journal.append("webhook_failed", url=job.url, operation=job.operation_name, payload=job.payload, attempts=job.attempts, error=job.last_error)
+
+def journal_ambiguous(job: retry_scheduler.RetryJob):
+    order_journal.append("webhook_ambiguous", url=job.url, operation=job.operation_name, payload=job.payload, attempts=job.attempts, error=job.last_error)
+
+def make_job(
+    url: str,
+    payload: Dict,
+    operation_name: str,
+    deadline: Optional[float] = None,
+    on_success: Optional[Callable[[retry_scheduler.RetryJob], None]] = None,
+    stage: str = "webhook"
+) -> retry_scheduler.RetryJob:
+    posted_at = latency_metrics.signal_posted_at.get()
+    expires_at = deadline if deadline is not None else time.monotonic() + retry_scheduler.get_max_age(payload)
+    
+    def acknowledge(job: retry_scheduler.RetryJob):
+        latency_metrics.observe_since_signal("signal_to_ack", posted_at, webhook=stage)
+        journal_ack(job)
+        if on_success:
+            on_success(job)
+    
+    return retry_scheduler.RetryJob(url, payload, operation_name, expires_at, on_success=acknowledge, on_failure=journal_failure, on_ambiguous=journal_ambiguous, signal_id=event_log.current_signal.get())
+
+def handle_failure(job: retry_scheduler.RetryJob, result: WebhookResult, status_code: Optional[int], error: Optional[str], retry_after: Optional[float] = None, ambiguous: bool = False):
+    job.last_error = error
+    if ambiguous:
+        job.last_error = result.error = f"ambiguous: {error}"
+        log.error("%s to %s may have been accepted, not resending: %s", job.operation_name, job.url, error)
+        journal_ambiguous(job)
+    elif retry_scheduler.is_retryable_status(status_code) and config.WEBHOOK_MAX_ATTEMPTS > 1:
+        retry_scheduler.schedule(job, retry_after)
+        result.pending = True
+        log.info("%s to %s scheduled for retry in the background", job.operation_name, job.url)
+    else:
+        journal_failure(job)
+
+def dispatch(job: retry_scheduler.RetryJob, result: WebhookResult, stage: str) -> WebhookResult:
+    started = time.monotonic()
+    
+    # Orders to one receiver must stay in order, so queue behind any retries still pending for it
+    if retry_scheduler.has_pending(job.url):
+        log.info("%s queued behind pending retries for %s", job.operation_name, job.url)
+        retry_scheduler.schedule(job)
+        result.pending = True
+        return result
+    
+    job.attempts = 1
+    success, status_code, error, retry_after, ambiguous = retry_scheduler.post_once(job.url, job.payload, min(config.HTTP_TIMEOUT_SECONDS, max(0.1, job.expires_at - started)))
+    result.attempts = 1
+    result.status_code = status_code
+    result.error = error
+    result.elapsed = time.monotonic() - started
+    latency_metrics.observe(stage, result.elapsed, outcome="ok" if success else "error")
+    
+    if success:
+        result.success = True
+        job.on_success(job)
+        return result
+    
+    log.warning("Error submitting %s to %s (attempt 1): %s", job.operation_name, job.url, error)
+    handle_failure(job, result, status_code, error, retry_after, ambiguous)
+    return result
+
+def deliver(
+    url: str,
+    payload: Dict,
+    operation_name: str,
+    deadline: Optional[float] = None,
+    on_success: Optional[Callable[[retry_scheduler.RetryJob], None]] = None,
+    stage: str = "webhook"
+) -> WebhookResult:
+    job = make_job(url, payload, operation_name, deadline, on_success, stage)
+    result = WebhookResult(url=url, operation_name=operation_name)
+    
+    # Inside a batch the order is collected and sent with the rest of the signal's orders
+    items = current_batch.get()
+    if items is not None and url in config.WEBHOOK_BATCH_URLS:
+        items.append(BatchItem(job, result, stage))
+        result.pending = True
+        return result
+    
+    return dispatch(job, result, stage)
+
+@dataclass
+class BatchItem:
+    job: retry_scheduler.RetryJob
+    result: WebhookResult
+    stage: str
+
+# Orders collected while a signal is handled. Only URLs listed in WEBHOOK_BATCH_URLS get envelopes;
+# support is never probed with live orders.
+current_batch: contextvars.ContextVar[Optional[List[BatchItem]]] = contextvars.ContextVar("current_batch", default=None)
+window_buffers: Dict[str, List[BatchItem]] = {}
+window_lock = threading.Lock()
+
+@contextmanager
+def batch():
+    if not config.WEBHOOK_BATCH_URLS or current_batch.get() is not None:
+        yield
+        return
+    items: List[BatchItem] = []
+    token = current_batch.set(items)
+    try:
+        yield
+    finally:
+        current_batch.reset(token)
+        if items:
+            flush_batch(items)
+
+def run_batched(func: Callable, *args, **kwargs):
+    with batch():
+        return func(*args, **kwargs)
+
+def flush_batch(items: List[BatchItem]):
+    by_url: Dict[str, List[BatchItem]] = {}
+    for item in items:
+        by_url.setdefault(item.job.url, []).append(item)
+    
+    if len(by_url) == 1:
+        for url, url_items in by_url.items():
+            coalesce(url, url_items)
+        return
+    for future in [submit_in_context(coalesce, url, url_items) for url, url_items in by_url.items()]:
+        future.result()
+
+def coalesce(url: str, items: List[BatchItem]):
+    if config.WEBHOOK_BATCH_WINDOW_SECONDS <= 0:
+        send_batch(url, items)
+        return
+    
+    # The first signal to reach an idle URL holds the window open and sends whatever other
+    # signals add to it meanwhile; later ones just leave their orders in the buffer
+    with window_lock:
+        buffer = window_buffers.get(url)
+        if buffer is not None:
+            buffer.extend(items)
+            return
+        window_buffers[url] = list(items)
+    time.sleep(config.WEBHOOK_BATCH_WINDOW_SECONDS)
+    with window_lock:
+        items = window_buffers.pop(url)
+    send_batch(url, items)
+
+def send_individually(items: List[BatchItem]):
+    for item in items:
+        item.result.pending = False
+        dispatch(item.job, item.result, item.stage)
+
+def send_batch(url: str, items: List[BatchItem]):
+    if len(items) == 1 or retry_scheduler.has_pending(url):
+        send_individually(items)
+        return
+    
+    started = time.monotonic()
+    by_id = {next_sequence(): item for item in items}
+    envelope = {"batch": [{**item.job.payload, "id": item_id} for item_id, item in by_id.items()]}
+    timeout = min(config.HTTP_TIMEOUT_SECONDS, max(0.1, min(item.job.expires_at for item in items) - started))
+    
+    response, results, error, ambiguous = None, None, None, False
+    try:
+        response = http_client.post(url, json=envelope, timeout=timeout)
     except Exception as e:
-        print(f"Error sending ntfy notification: {e}")
+        error = str(e)
+        ambiguous = not retry_scheduler.is_unsent(e)
+    if response is not None and response.ok:
+        try:
+            body = response.json()
+            results = body.get("results") if isinstance(body, dict) else None
+        except ValueError:
+            pass
+    
+    elapsed = time.monotonic() - started
+    latency_metrics.observe("webhook_batch", elapsed, outcome="ok" if response is not None and response.ok else "error")
+    if response is None or not response.ok:
+        error = error or f"HTTP {response.status_code}: {response.text[:200]}"
+        log.error("Error submitting batch of %s order(s) to %s: %s", len(items), url, error)
+        for item in items:
+            item.job.attempts = 1
+            item.result.pending = False
+            handle_failure(item.job, item.result, None if response is None else response.status_code, error, ambiguous=ambiguous)
+        return
+    
+    if not isinstance(results, list):
+        log.error("%s accepted a batch of %s order(s) without per-item results (HTTP %s); not resending", url, len(items), response.status_code)
+        results = []
+    results = {entry.get("id"): entry for entry in results if isinstance(entry, dict)}
+    for item_id, item in by_id.items():
+        job, result = item.job, item.result
+        job.attempts = result.attempts = 1
+        result.pending = False
+        result.elapsed = elapsed
+        entry = results.get(item_id)
+        if entry is None:
+            # The receiver took the envelope, so the order may have been placed; sending it again could double it
+            result.status_code = response.status_code
+            result.error = job.last_error = "is ambiguous: accepted in a batch without a result for this order"
+            latency_metrics.observe(item.stage, elapsed, outcome="ambiguous")
+            latency_metrics.increment("webhook_batch_ambiguous_total")
+            log.error("%s to %s %s", job.operation_name, url, result.error)
+            journal_ambiguous(job)
+            continue
+        result.status_code = entry.get("status")
+        if result.status_code is not None and 200 <= result.status_code < 300:
+            result.success = True
+            latency_metrics.observe(item.stage, elapsed, outcome="ok")
+            log.info("%s submitted successfully to %s in a batch of %s", job.operation_name, url, len(items))
+            job.on_success(job)
+        else:
+            result.error = entry.get("error") or f"HTTP {result.status_code}"
+            latency_metrics.observe(item.stage, elapsed, outcome="error")
+            log.error("Error submitting %s to %s in a batch: %s", job.operation_name, url, result.error)
+            handle_failure(job, result, result.status_code, result.error)
 
 def send_webhook(
     payload: Dict,
@@ -77,11 +318,12 @@ def send_webhook(
     quantity: Optional[int] = None,
     operation_name: str = "webhook",
     is_entry_trade: bool = False,
-    additional_context: Optional[Dict] = None
-):
+    additional_context: Optional[Dict] = None,
+    deadline: Optional[float] = None
+) -> WebhookResult:
     if not url:
-        print(f"No URL provided for {operation_name}")
-        return
+        log.warning("No URL provided for %s", operation_name)
+        return WebhookResult(url=url, operation_name=operation_name, error="no url")
     
     webhook_payload = payload.copy()
     if quantity is not None:
@@ -89,59 +331,125 @@ def send_webhook(
     elif "quantity" not in webhook_payload:
         webhook_payload["quantity"] = config.GLOBAL_QUANTITY
     
-    for attempt in range(5):
-        try:
-            webhook_response = requests.post(url, json=webhook_payload)
-            webhook_response.raise_for_status()
-            qty_info = f" (qty: {webhook_payload.get('quantity')})"
-            print(f"{operation_name} submitted successfully to {url}{qty_info} (attempt {attempt + 1})")
-            if is_entry_trade:
-                send_ntfy_notification(webhook_payload, quantity, operation_name, additional_context)
-            break
-        except Exception as e:
-            print(f"Error submitting {operation_name} to {url} (attempt {attempt + 1}): {e}")
-            if attempt < 4:
-                time.sleep(1)
-            else:
-                print(f"{operation_name} failed after all retries for {url}")
-
-def send_cancel_webhook(ticker: str, url: str):
+    on_success = None
+    if is_entry_trade:
+        on_success = lambda job: send_ntfy_notification(webhook_payload, quantity, operation_name, additional_context)
+    
+    stage = "entry_webhook" if is_entry_trade else "webhook"
+    result = deliver(url, webhook_payload, operation_name, deadline, on_success, stage)
+    if result.success:
+        log.info("%s submitted successfully to %s (attempt %s)", operation_name, url, result.attempts, quantity=webhook_payload.get("quantity"))
+    elif not result.pending:
+        log.warning("%s failed for %s: %s", operation_name, url, result.error)
+    return result
+
+def send_cancel_webhook(ticker: str, url: str, deadline: Optional[float] = None, sequence: Optional[int] = None) -> WebhookResult:
     if not url:
-        print(f"No URL provided for cancel webhook")
-        return
+        log.warning("No URL provided for cancel webhook")
+        return WebhookResult(url=url, operation_name="Cancel webhook", error="no url")
     
     cancel_payload = {
         "ticker": ticker,
         "action": "cancel"
     }
+    if sequence is not None:
+        cancel_payload["sequence"] = sequence
     
-    for attempt in range(5):
-        try:
-            webhook_response = requests.post(url, json=cancel_payload)
-            webhook_response.raise_for_status()
-            print(f"Cancel webhook sent successfully for {ticker} to {url} (attempt {attempt + 1})")
-            break
-        except Exception as e:
-            print(f"Error sending cancel webhook for {ticker} to {url} (attempt {attempt + 1}): {e}")
-            if attempt < 4:
-                time.sleep(1)
-            else:
-                print(f"Cancel webhook failed after all retries for {ticker} to {url}")
+    result = deliver(url, cancel_payload, "Cancel webhook", deadline, stage="cancel_webhook")
+    if result.success:
+        log.info("Cancel webhook sent successfully for %s to %s (attempt %s)", ticker, url, result.attempts)
+    elif not result.pending:
+        log.warning("Cancel webhook failed for %s to %s: %s", ticker, url, result.error)
+    return result
 
-def send_webhook_to_multiple_urls(
+def next_sequence() -> int:
+    global last_sequence
+    with sequence_lock:
+        last_sequence = max(last_sequence + 1, time.time_ns() // 1000)
+        return last_sequence
+
+def submit_in_context(func: Callable, *args, **kwargs):
+    return fanout_executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+def send_cancel_then_enter(
+    ticker: str,
+    payload: Dict,
+    url: str,
+    operation_name: str,
+    quantity: Optional[int],
+    is_entry_trade: bool,
+    additional_context: Optional[Dict]
+) -> Tuple[WebhookResult, WebhookResult]:
+    cancel = send_cancel_webhook(ticker, url)
+    return cancel, send_webhook(payload, url, quantity, operation_name, is_entry_trade, additional_context)
+
+def send_cancel_and_enter(
+    ticker: str,
     payload: Dict,
     urls: Union[List[str], str],
     operation_name: str = "webhook",
     quantity: Optional[int] = None,
     is_entry_trade: bool = False,
     additional_context: Optional[Dict] = None
-):
+) -> List[Tuple[WebhookResult, WebhookResult]]:
     if isinstance(urls, str):
         urls = [urls]
     
     if not urls:
-        print(f"No URLs provided for {operation_name}")
-        return
+        log.warning("No URLs provided for %s", operation_name)
+        return []
     
+    # Inside a batch both orders already travel in one request, in order
+    if not config.WEBHOOK_PIPELINE_CANCEL or current_batch.get() is not None:
+        if len(urls) == 1:
+            return [send_cancel_then_enter(ticker, payload, urls[0], operation_name, quantity, is_entry_trade, additional_context)]
+        # Each URL's cancel is followed by its own entry, and URLs proceed side by side rather than every
+        # entry waiting for all the cancels
+        futures = [
+            submit_in_context(send_cancel_then_enter, ticker, payload, url, operation_name, quantity, is_entry_trade, additional_context)
+            for url in urls
+        ]
+        return [future.result() for future in futures]
+    
+    # Cancel and entry go out together on separate pooled connections instead of the entry waiting
+    # a full cancel round trip; the entry names the cancel it must follow and the receiver orders them
+    pairs = []
     for url in urls:
-        send_webhook(payload, url, quantity, operation_name, is_entry_trade, additional_context)
+        cancel_sequence = next_sequence()
+        entry_payload = {**payload, "sequence": next_sequence(), "after_sequence": cancel_sequence}
+        pairs.append((
+            submit_in_context(send_cancel_webhook, ticker, url, sequence=cancel_sequence),
+            submit_in_context(send_webhook, entry_payload, url, quantity, operation_name, is_entry_trade, additional_context)
+        ))
+    return [(cancel.result(), entry.result()) for cancel, entry in pairs]
+
+def send_webhook_to_multiple_urls(
+    payload: Dict,
+    urls: Union[List[str], str],
+    operation_name: str = "webhook",
+    quantity: Optional[int] = None,
+    is_entry_trade: bool = False,
+    additional_context: Optional[Dict] = None
+) -> List[WebhookResult]:
+    if isinstance(urls, str):
+        urls = [urls]
+    
+    if not urls:
+        log.warning("No URLs provided for %s", operation_name)
+        return []
+    
+    if len(urls) == 1:
+        return [send_webhook(payload, urls[0], quantity, operation_name, is_entry_trade, additional_context)]
+    
+    # Each URL gets its own deadline so a slow endpoint cannot hold back the others
+    # Each submit runs in a copy of the caller's context so signal latency is still attributed
+    futures = [
+        submit_in_context(send_webhook, payload, url, quantity, operation_name, is_entry_trade, additional_context)
+        for url in urls
+    ]
+    results = [future.result() for future in futures]
+    
+    succeeded = sum(1 for result in results if result.success)
+    retrying = sum(1 for result in results if result.pending)
+    log.info("%s fan-out: %s/%s URLs succeeded, %s retrying", operation_name, succeeded, len(results), retrying)
+    return results
@@ -0,0 +1,170 @@
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import config
+import event_log
+
+log = event_log.get_logger("journal")
+
+# Events that replace the position under their key with the one they carry, and events that close it.
+# Everything else (cancel, webhook_ack, webhook_failed) is recorded for audit only.
+# Records written before positions were keyed carry no "key" and map to LEGACY_KEY.
+POSITION_EVENTS = {"entry", "trim", "update"}
+CLOSE_EVENTS = {"stop", "exit", "expire"}
+LEGACY_KEY = ""
+
+journal_lock = threading.RLock()
+journal_file = None
+segment_index = 0
+sequence = 0
+positions: Dict[str, Dict[str, Any]] = {}
+recovered = False
+dirty = False
+sync_thread: Optional[threading.Thread] = None
+
+def segment_path(index: int) -> str:
+    return os.path.join(config.JOURNAL_DIR, f"segment-{index:06d}.jsonl")
+
+def list_segments() -> List[int]:
+    if not os.path.isdir(config.JOURNAL_DIR):
+        return []
+    indexes = []
+    for name in os.listdir(config.JOURNAL_DIR):
+        if name.startswith("segment-") and name.endswith(".jsonl"):
+            indexes.append(int(name[len("segment-"):-len(".jsonl")]))
+    return sorted(indexes)
+
+def apply_event(state: Dict[str, Dict[str, Any]], event: Dict[str, Any]):
+    event_type = event.get("type")
+    key = event.get("key", LEGACY_KEY)
+    if event_type == "snapshot":
+        state.clear()
+        if "positions" in event:
+            state.update(event["positions"])
+        elif event.get("position") is not None:
+            state[LEGACY_KEY] = event["position"]
+    elif event_type in POSITION_EVENTS:
+        state[key] = event.get("position")
+    elif event_type in CLOSE_EVENTS:
+        if "key" in event:
+            state.pop(key, None)
+        else:
+            # An unkeyed close comes from the single-position era and closed whatever was open
+            state.clear()
+
+def read_segment(index: int) -> List[Dict[str, Any]]:
+    events = []
+    with open(segment_path(index), 'r') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn final line from a crash mid-append; everything before it is intact
+                log.warning("Skipping corrupt journal record in %s", segment_path(index))
+    return events
+
+def truncate_torn_tail(index: int):
+    # Appends reopen the last segment, and one written after a torn record would be glued onto it
+    with open(segment_path(index), 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+def replay() -> Dict[str, Dict[str, Any]]:
+    global sequence, segment_index, recovered
+    with journal_lock:
+        if recovered:
+            return copy.deepcopy(positions)
+        recovered = True
+
+        segments = list_segments()
+        replayed = 0
+        for index in segments:
+            for event in read_segment(index):
+                apply_event(positions, event)
+                sequence = max(sequence, event.get("seq", 0))
+                replayed += 1
+        segment_index = segments[-1] if segments else 0
+        if segments:
+            truncate_torn_tail(segment_index)
+            log.info("Replayed %s journal event(s) from %s segment(s), %s open position(s)", replayed, len(segments), len(positions))
+            if len(segments) > 1:
+                compact()
+        return copy.deepcopy(positions)
+
+def has_journal() -> bool:
+    return bool(list_segments())
+
+def open_segment(index: int):
+    global journal_file, segment_index
+    os.makedirs(config.JOURNAL_DIR, exist_ok=True)
+    if journal_file is not None:
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+        journal_file.close()
+    segment_index = index
+    journal_file = open(segment_path(index), 'a')
+
+def write_record(event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    global sequence, dirty
+    sequence += 1
+    event = {"seq": sequence, "ts": datetime.now().isoformat(), "type": event_type, **data}
+    journal_file.write(json.dumps(event) + "\n")
+    # Hand the record to the OS now so a process crash cannot lose it; fsync is batched
+    journal_file.flush()
+    dirty = True
+    return event
+
+def append(event_type: str, **data):
+    with journal_lock:
+        replay()
+        if journal_file is None:
+            open_segment(max(segment_index, 1))
+        event = write_record(event_type, data)
+        apply_event(positions, event)
+        if journal_file.tell() >= config.JOURNAL_SEGMENT_MAX_BYTES:
+            compact()
+    ensure_sync_thread()
+
+def compact():
+    with journal_lock:
+        old_segments = list_segments()
+        open_segment((old_segments[-1] if old_segments else segment_index) + 1)
+        write_record("snapshot", {"positions": positions})
+        sync()
+        for index in old_segments:
+            if index < segment_index:
+                os.remove(segment_path(index))
+        log.info("Compacted order journal into segment %s", segment_index)
+
+def sync():
+    global dirty
+    with journal_lock:
+        if journal_file is None or not dirty:
+            return
+        dirty = False
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+
+def sync_loop():
+    while True:
+        time.sleep(config.JOURNAL_FSYNC_INTERVAL_SECONDS)
+        try:
+            sync()
+        except Exception as e:
+            log.error("Error syncing order journal: %s", e)
+
+def ensure_sync_thread():
+    global sync_thread
+    if sync_thread is None:
+        with journal_lock:
+            if sync_thread is None:
+                sync_thread = threading.Thread(target=sync_loop, name="journal-sync", daemon=True)
+                sync_thread.start()
+
+atexit.register(sync)
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Union
+import config
+import event_log
+import latency_metrics
+import market_session
+
+log = event_log.get_logger("poll")
+
+def _run_check(name: str, check: Callable[[], None]):
+    try:
+        check()
+    except Exception as e:
+        log.error("Error polling %s: %s", name, e)
+
+def get_delay(name: str, interval: Union[float, Callable[[str], float]]) -> float:
+    if not callable(interval):
+        return interval
+    try:
+        return interval(name)
+    except Exception as e:
+        log.error("Error computing poll delay for %s: %s", name, e)
+        return 1.0
+
+def next_deadline(name: str, deadline: float, period: float) -> float:
+    # Deadlines sit on a fixed grid, so the time spent polling comes out of the period
+    # instead of being added to it
+    now = time.monotonic()
+    deadline += period
+    if now <= deadline:
+        latency_metrics.increment("poll_ticks_total", channel=name, outcome="on_time")
+        return deadline
+
+    # The tick ran past one or more later deadlines
+    passed = int((now - deadline) // period) + 1 if period > 0 else 1
+    latency_metrics.observe("tick_overrun", now - deadline, channel=name)
+    latency_metrics.increment("poll_ticks_total", channel=name, outcome="overrun")
+    if config.TICK_OVERRUN_POLICY == "skip":
+        # Stay on the grid: every deadline that went by is dropped
+        latency_metrics.increment("poll_ticks_skipped_total", passed, channel=name)
+        return deadline + passed * period
+    # Merge: the deadlines that went by collapse into one tick fired straight away
+    latency_metrics.increment("poll_ticks_skipped_total", passed - 1, channel=name)
+    return now
+
+async def poll_channel(name: str, check: Callable[[], None], interval: Union[float, Callable[[str], float]]):
+    # Each channel gets its own worker thread, so a slow fetch in one room never waits for
+    # a free slot in a shared pool behind the others
+    loop = asyncio.get_running_loop()
+    worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"poll-{name}")
+    deadline = time.monotonic()
+    try:
+        while True:
+            if not market_session.is_open():
+                wait = market_session.seconds_until_change()
+                log.info("Market session closed, %s idle for %.0fs", name, wait)
+                await asyncio.sleep(wait)
+                # The grid restarts at the session boundary rather than counting the closed hours as lateness
+                deadline = time.monotonic()
+                continue
+
+            latency_metrics.observe("tick_lateness", max(0.0, time.monotonic() - deadline), channel=name)
+            await loop.run_in_executor(worker, _run_check, name, check)
+            deadline = next_deadline(name, deadline, get_delay(name, interval))
+            await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+    finally:
+        worker.shutdown(wait=False)
+
+async def run_pollers(checks: Dict[str, Callable[[], None]], interval: Union[float, Callable[[str], float]]):
+    if not checks:
+        log.warning("No channels configured, nothing to poll")
+        return
+    
+    tasks = [
+        asyncio.create_task(poll_channel(name, check, interval), name=f"poll:{name}")
+        for name, check in checks.items()
+    ]
+    cadence = "adaptively" if callable(interval) else f"every {interval}s"
+    log.info("Polling %s channel(s) %s: %s", len(tasks), cadence, ', '.join(checks))
+    await asyncio.gather(*tasks)
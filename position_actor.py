@@ -0,0 +1,36 @@
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable
+
+# One single-thread executor per position key: every state transition for a position runs
+# in submission order on its own thread, while different positions run in parallel
+actors: Dict[Hashable, ThreadPoolExecutor] = {}
+actors_lock = threading.Lock()
+running = threading.local()
+
+def get_actor(key: Hashable) -> ThreadPoolExecutor:
+    with actors_lock:
+        actor = actors.get(key)
+        if actor is None:
+            actor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"position-{'-'.join(map(str, key))}")
+            actors[key] = actor
+        return actor
+
+def run_as(key: Hashable, func: Callable, *args, **kwargs) -> Any:
+    running.key = key
+    try:
+        return func(*args, **kwargs)
+    finally:
+        running.key = None
+
+def submit(key: Hashable, func: Callable, *args, **kwargs) -> Future:
+    # The caller's context carries the signal timestamp used for end-to-end latency
+    context = contextvars.copy_context()
+    return get_actor(key).submit(context.run, run_as, key, func, *args, **kwargs)
+
+def run(key: Hashable, func: Callable, *args, **kwargs) -> Any:
+    # A transition already running on this position's actor calls straight through
+    if getattr(running, "key", None) == key:
+        return func(*args, **kwargs)
+    return submit(key, func, *args, **kwargs).result()
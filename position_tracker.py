@@ -1,52 +1,188 @@
+import atexit
+import copy
 import os
 import json
+import threading
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any, Tuple
 import config
+import event_log
+import latency_metrics
+import order_journal
+import position_actor
 
-def save_open_order(order_info: Dict[str, Any]):
-    order_data = {
-        "timestamp": datetime.now().isoformat(),
-        "order_info": order_info
-    }
-    with open(config.ORDER_FILE, 'w') as f:
-        json.dump(order_data, f)
-
-def has_open_order() -> bool:
-    if not os.path.exists(config.ORDER_FILE):
-        return False
-    
-    try:
-        with open(config.ORDER_FILE, 'r') as f:
-            order_data = json.load(f)
-        
-        order_timestamp = datetime.fromisoformat(order_data["timestamp"])
-        if datetime.now() - order_timestamp > timedelta(hours=1):
-            clear_open_order()
+log = event_log.get_logger("position")
+
+ORDER_EXPIRY = timedelta(hours=1)
+# Replaceable so a backtest can run positions on the replayed messages' clock
+clock = datetime.now
+DEFAULT_STRATEGY = "default"
+
+# A position is keyed by (ticker, source, strategy) so each signal source trades its own book
+PositionKey = Tuple[str, str, str]
+
+# The in-memory book is authoritative and the journal is its only durable record. The order file
+# is a snapshot written at exit for tools that still read it; it is only loaded when no journal exists.
+# A single open position is written in the unkeyed pre-journal shape older builds read; several can
+# only be written keyed, which those builds do not understand.
+open_orders: Dict[PositionKey, Dict[str, Any]] = {}
+loaded = False
+state_lock = threading.RLock()
+write_lock = threading.Lock()
+
+def position_key(ticker: str, source: str, strategy: str = DEFAULT_STRATEGY) -> PositionKey:
+    return (ticker, source, strategy)
+
+def key_for_order(order_info: Dict[str, Any]) -> PositionKey:
+    return position_key(order_info.get("ticker", config.TICKER_SYMBOL), order_info.get("source", "unknown"), order_info.get("strategy", DEFAULT_STRATEGY))
+
+def encode_key(key: PositionKey) -> str:
+    return "|".join(key)
+
+def decode_key(value: str, order_data: Dict[str, Any]) -> PositionKey:
+    if value == order_journal.LEGACY_KEY:
+        return key_for_order(order_data["order_info"])
+    ticker, source, strategy = value.split("|")
+    return (ticker, source, strategy)
+
+def load_positions(encoded: Dict[str, Dict[str, Any]]) -> Dict[PositionKey, Dict[str, Any]]:
+    positions = {}
+    for value, order_data in encoded.items():
+        datetime.fromisoformat(order_data["timestamp"])
+        positions[decode_key(value, order_data)] = order_data
+    return positions
+
+def encode_positions(positions: Dict[PositionKey, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {encode_key(key): order_data for key, order_data in positions.items()}
+
+def read_order_file() -> Dict[str, Dict[str, Any]]:
+    with open(config.ORDER_FILE, 'r') as f:
+        data = json.load(f)
+    # Files written before positions were keyed hold a single order at the top level
+    if "positions" not in data:
+        return {order_journal.LEGACY_KEY: data}
+    return data["positions"]
+
+def load_open_orders():
+    global open_orders, loaded
+    with state_lock:
+        if loaded:
+            return
+        loaded = True
+        if order_journal.has_journal():
+            encoded = order_journal.replay()
+            open_orders = load_positions(encoded)
+            if order_journal.LEGACY_KEY in encoded:
+                order_journal.append("snapshot", positions=encode_positions(open_orders))
+            return
+        if not os.path.exists(config.ORDER_FILE):
+            return
+        try:
+            open_orders = load_positions(read_order_file())
+            order_journal.append("snapshot", positions=encode_positions(open_orders))
+        except Exception as e:
+            log.error("Error loading %s, starting flat: %s", config.ORDER_FILE, e)
+            open_orders = {}
+
+def write_order_file(positions: Dict[str, Dict[str, Any]]):
+    if not positions:
+        if os.path.exists(config.ORDER_FILE):
+            os.remove(config.ORDER_FILE)
+        return
+
+    tmp_path = f"{config.ORDER_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(next(iter(positions.values())) if len(positions) == 1 else {"positions": positions}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, config.ORDER_FILE)
+
+def flush():
+    with write_lock:
+        with state_lock:
+            if not loaded:
+                return
+            positions = copy.deepcopy(encode_positions(open_orders))
+        try:
+            write_order_file(positions)
+        except Exception as e:
+            log.error("Error writing open order snapshot: %s", e)
+
+def save_open_order(order_info: Dict[str, Any], event: str = "update") -> PositionKey:
+    key = key_for_order(order_info)
+    with state_lock:
+        load_open_orders()
+        order_data = {
+            "timestamp": clock().isoformat(),
+            "order_info": copy.deepcopy(order_info)
+        }
+        open_orders[key] = order_data
+        order_journal.append(event, key=encode_key(key), position=order_data)
+    return key
+
+def open_if_flat(order_info: Dict[str, Any], event: str = "entry", conflicts: Optional[Callable[[PositionKey], bool]] = None) -> bool:
+    # Check-and-set: only one of two concurrent entries for the same key can open the position.
+    # conflicts marks other books on the same ticker that this entry must also wait for.
+    key = key_for_order(order_info)
+    with state_lock:
+        load_open_orders()
+        if get_live_order(key) is not None:
             return False
-        
+        if conflicts is not None:
+            for other in list(open_orders):
+                if other != key and other[0] == key[0] and conflicts(other) and get_live_order(other) is not None:
+                    log.warning("Entry for %s blocked: %s holds %s on the same receiver", encode_key(key), encode_key(other), key[0])
+                    return False
+        save_open_order(order_info, event)
         return True
-    except:
-        return False
 
-def clear_open_order():
-    if os.path.exists(config.ORDER_FILE):
-        os.remove(config.ORDER_FILE)
+def is_expired(order_data: Dict[str, Any]) -> bool:
+    return clock() - datetime.fromisoformat(order_data["timestamp"]) > ORDER_EXPIRY
 
-def get_open_order_info() -> Optional[Dict[str, Any]]:
-    if not has_open_order():
-        return None
-    try:
-        with open(config.ORDER_FILE, 'r') as f:
-            return json.load(f)
-    except:
+def get_live_order(key: PositionKey) -> Optional[Dict[str, Any]]:
+    order_data = open_orders.get(key)
+    if order_data is not None and is_expired(order_data):
+        clear_open_order(key, "expire")
         return None
+    return order_data
+
+@latency_metrics.timed("position_lookup", op="has_open_order")
+def has_open_order(key: PositionKey) -> bool:
+    with state_lock:
+        load_open_orders()
+        return get_live_order(key) is not None
+
+def has_any_open_order(source: Optional[str] = None) -> bool:
+    with state_lock:
+        load_open_orders()
+        return any(source is None or key[1] == source for key, order_data in open_orders.items() if not is_expired(order_data))
+
+def clear_open_order(key: PositionKey, event: str = "exit"):
+    with state_lock:
+        load_open_orders()
+        if open_orders.pop(key, None) is None:
+            return
+        order_journal.append(event, key=encode_key(key))
+
+@latency_metrics.timed("position_lookup", op="get_open_order_info")
+def get_open_order_info(key: PositionKey) -> Optional[Dict[str, Any]]:
+    with state_lock:
+        load_open_orders()
+        return copy.deepcopy(get_live_order(key))
+
+def expire_if_stale(key: PositionKey):
+    with state_lock:
+        order_data = open_orders.get(key)
+        if order_data is not None and is_expired(order_data):
+            log.info("Order %s expired (1 hour), clearing...", encode_key(key))
+            clear_open_order(key, "expire")
 
 def reset_orders_if_expired():
-    if has_open_order():
-        order_info = get_open_order_info()
-        if order_info:
-            order_timestamp = datetime.fromisoformat(order_info["timestamp"])
-            if datetime.now() - order_timestamp > timedelta(hours=1):
-                print("Order expired (1 hour), clearing...")
-                clear_open_order()
+    with state_lock:
+        load_open_orders()
+        stale = [key for key, order_data in open_orders.items() if is_expired(order_data)]
+    # Expiry goes through the position's actor so it cannot land in the middle of a trim or exit
+    for key in stale:
+        position_actor.submit(key, expire_if_stale, key)
+
+atexit.register(flush)
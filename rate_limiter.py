@@ -0,0 +1,91 @@
+import threading
+import time
+from datetime import datetime, time as dt_time
+from typing import Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+import config
+import event_log
+
+log = event_log.get_logger("rate_limit")
+
+# Discord limits the messages route per channel (the bucket) and every token globally.
+# Bucket state is tracked per (token, channel); 429s flagged global block the whole token.
+buckets: Dict[Tuple[str, str], Dict[str, float]] = {}
+global_blocks: Dict[str, float] = {}
+limiter_lock = threading.Lock()
+stats = {"rate_limited": 0, "global_rate_limited": 0}
+
+def parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def record_response(token: str, channel_id: str, response):
+    now = time.monotonic()
+    headers = response.headers
+    remaining = parse_float(headers.get("X-RateLimit-Remaining"))
+    reset_after = parse_float(headers.get("X-RateLimit-Reset-After"))
+
+    with limiter_lock:
+        bucket = buckets.setdefault((token, channel_id), {"remaining": 1.0, "reset_at": 0.0, "blocked_until": 0.0})
+        if remaining is not None:
+            bucket["remaining"] = remaining
+        if reset_after is not None:
+            bucket["reset_at"] = now + reset_after
+
+        if response.status_code != 429:
+            return
+
+        retry_after = parse_float(headers.get("Retry-After"))
+        try:
+            retry_after = float(response.json().get("retry_after", retry_after))
+        except Exception:
+            pass
+        retry_after = retry_after if retry_after is not None else (reset_after or 1.0)
+
+        if headers.get("X-RateLimit-Global", "").lower() == "true" or headers.get("X-RateLimit-Scope") == "global":
+            global_blocks[token] = now + retry_after
+            stats["global_rate_limited"] += 1
+            log.warning("Global Discord rate limit hit, backing off %.2fs", retry_after)
+        else:
+            bucket["blocked_until"] = now + retry_after
+            bucket["remaining"] = 0.0
+            stats["rate_limited"] += 1
+            log.warning("Discord rate limit hit for channel %s, backing off %.2fs", channel_id, retry_after)
+
+def wait_time(token: str, channel_id: str) -> float:
+    now = time.monotonic()
+    with limiter_lock:
+        wait = global_blocks.get(token, 0.0) - now
+        bucket = buckets.get((token, channel_id))
+        if bucket:
+            wait = max(wait, bucket["blocked_until"] - now)
+            if bucket["remaining"] <= 0:
+                wait = max(wait, bucket["reset_at"] - now)
+    return max(0.0, wait)
+
+def budget_spacing(token: str, channel_id: str) -> float:
+    # Spread the requests left in the bucket evenly over the time until it resets
+    now = time.monotonic()
+    with limiter_lock:
+        bucket = buckets.get((token, channel_id))
+        if not bucket or bucket["reset_at"] <= now:
+            return 0.0
+        return (bucket["reset_at"] - now) / max(bucket["remaining"], 1.0)
+
+def is_regular_trading_hours(now: Optional[datetime] = None) -> bool:
+    now = now or datetime.now(ZoneInfo(config.MARKET_TIMEZONE))
+    if now.weekday() >= 5:
+        return False
+    return dt_time.fromisoformat(config.RTH_START) <= now.time() < dt_time.fromisoformat(config.RTH_END)
+
+def desired_interval(position_open: bool) -> float:
+    if position_open:
+        return config.POLL_INTERVAL_FAST_SECONDS
+    if is_regular_trading_hours():
+        return config.POLL_INTERVAL_SECONDS
+    return config.POLL_INTERVAL_SLOW_SECONDS
+
+def next_poll_delay(token: str, channel_id: str, position_open: bool) -> float:
+    return max(desired_interval(position_open), budget_spacing(token, channel_id), wait_time(token, channel_id))
@@ -0,0 +1,165 @@
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Optional, Tuple
+import requests
+import config
+import event_log
+import http_client
+
+log = event_log.get_logger("retry")
+
+RETRYABLE_STATUS_CODES = {408, 425, 429}
+
+@dataclass
+class RetryJob:
+    url: str
+    payload: Dict
+    operation_name: str
+    expires_at: float
+    attempts: int = 0
+    next_attempt_at: float = 0.0
+    last_error: Optional[str] = None
+    on_success: Optional[Callable[["RetryJob"], None]] = None
+    on_failure: Optional[Callable[["RetryJob"], None]] = None
+    on_ambiguous: Optional[Callable[["RetryJob"], None]] = None
+    created_at: float = field(default_factory=time.monotonic)
+    # Retries run on the scheduler thread, outside the signal's context, so the id travels with the job
+    signal_id: Optional[str] = None
+
+pending: Dict[str, Deque[RetryJob]] = {}
+condition = threading.Condition()
+# One worker per URL, so a receiver that hangs only holds up its own retries
+worker_threads: Dict[str, threading.Thread] = {}
+stats = {"scheduled": 0, "succeeded": 0, "failed": 0, "ambiguous": 0, "dropped_stale": 0}
+
+def is_retryable_status(status_code: Optional[int]) -> bool:
+    if status_code is None:
+        return True
+    return status_code >= 500 or status_code in RETRYABLE_STATUS_CODES
+
+def get_max_age(payload: Dict) -> float:
+    if payload.get("orderType") == "market":
+        return config.WEBHOOK_MARKET_ORDER_MAX_AGE_SECONDS
+    return config.WEBHOOK_MAX_AGE_SECONDS
+
+def is_unsent(error: Exception) -> bool:
+    # Only a failure to connect proves the receiver never saw the order; after a read timeout or a
+    # dropped response it may already have been accepted, and sending it again could double it
+    return isinstance(error, requests.ConnectionError)
+
+def backoff_delay(attempts: int, retry_after: Optional[float] = None) -> float:
+    delay = min(config.WEBHOOK_RETRY_MAX_BACKOFF_SECONDS, config.WEBHOOK_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    delay += random.uniform(0, delay * config.WEBHOOK_RETRY_JITTER)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+# (success, status code, error, Retry-After, ambiguous); ambiguous means the order may have been accepted
+def post_once(url: str, payload: Dict, timeout: Optional[float] = None) -> Tuple[bool, Optional[int], Optional[str], Optional[float], bool]:
+    try:
+        response = http_client.post(url, json=payload, timeout=timeout or config.HTTP_TIMEOUT_SECONDS)
+    except Exception as e:
+        return False, None, str(e), None, not is_unsent(e)
+
+    if response.ok:
+        return True, response.status_code, None, None, False
+
+    retry_after = None
+    try:
+        retry_after = float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        pass
+    return False, response.status_code, f"HTTP {response.status_code}: {response.text[:200]}", retry_after, False
+
+def has_pending(url: str) -> bool:
+    with condition:
+        return bool(pending.get(url))
+
+def schedule(job: RetryJob, retry_after: Optional[float] = None):
+    job.next_attempt_at = time.monotonic() + (backoff_delay(job.attempts, retry_after) if job.attempts else 0.0)
+    with condition:
+        pending.setdefault(job.url, deque()).append(job)
+        stats["scheduled"] += 1
+        if job.url not in worker_threads:
+            worker_threads[job.url] = threading.Thread(target=run_worker, args=(job.url,), name=f"webhook-retry-{len(worker_threads)}", daemon=True)
+            worker_threads[job.url].start()
+        condition.notify_all()
+
+def next_due_job(url: str) -> RetryJob:
+    with condition:
+        while True:
+            now = time.monotonic()
+            jobs = pending.get(url)
+            if jobs:
+                job = jobs[0]
+                if job.next_attempt_at <= now:
+                    return job
+                condition.wait(job.next_attempt_at - now)
+            else:
+                condition.wait()
+
+def run_callback(job: RetryJob, callback: Optional[Callable[[RetryJob], None]]):
+    if not callback:
+        return
+    try:
+        callback(job)
+    except Exception as e:
+        log.error("Error in callback for %s: %s", job.operation_name, e, signal=job.signal_id, exc_info=True)
+
+def finish(job: RetryJob):
+    with condition:
+        jobs = pending.get(job.url)
+        if jobs and jobs[0] is job:
+            jobs.popleft()
+        if not jobs:
+            pending.pop(job.url, None)
+        # The next job for this URL was held back only to keep ordering; send it now
+        if jobs:
+            jobs[0].next_attempt_at = min(jobs[0].next_attempt_at, time.monotonic())
+        condition.notify_all()
+
+def run_worker(url: str):
+    while True:
+        job = next_due_job(url)
+
+        remaining = job.expires_at - time.monotonic()
+        if remaining <= 0:
+            stats["dropped_stale"] += 1
+            log.warning("Dropping stale %s to %s after %s attempt(s): %s", job.operation_name, job.url, job.attempts, job.last_error, signal=job.signal_id)
+            job.last_error = f"dropped stale: {job.last_error}"
+            finish(job)
+            run_callback(job, job.on_failure)
+            continue
+
+        job.attempts += 1
+        # A retry never waits on the receiver past the point where the order would be dropped as stale
+        success, status_code, error, retry_after, ambiguous = post_once(job.url, job.payload, timeout=min(remaining, config.HTTP_TIMEOUT_SECONDS))
+        if success:
+            stats["succeeded"] += 1
+            log.info("%s submitted successfully to %s (attempt %s)", job.operation_name, job.url, job.attempts, signal=job.signal_id, quantity=job.payload.get("quantity"))
+            finish(job)
+            run_callback(job, job.on_success)
+            continue
+
+        if ambiguous:
+            stats["ambiguous"] += 1
+            job.last_error = f"ambiguous: {error}"
+            log.error("%s to %s may have been accepted (attempt %s), not resending: %s", job.operation_name, job.url, job.attempts, error, signal=job.signal_id)
+            finish(job)
+            run_callback(job, job.on_ambiguous)
+            continue
+
+        job.last_error = error
+        log.warning("Error submitting %s to %s (attempt %s): %s", job.operation_name, job.url, job.attempts, error, signal=job.signal_id)
+        if not is_retryable_status(status_code) or job.attempts >= config.WEBHOOK_MAX_ATTEMPTS:
+            stats["failed"] += 1
+            log.error("%s failed after %s attempt(s) for %s", job.operation_name, job.attempts, job.url, signal=job.signal_id)
+            finish(job)
+            run_callback(job, job.on_failure)
+            continue
+
+        with condition:
+            job.next_attempt_at = time.monotonic() + backoff_delay(job.attempts, retry_after)
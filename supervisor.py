@@ -0,0 +1,137 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+import config
+import channel_registry
+import discord_scraper
+import event_log
+import latency_metrics
+import position_tracker
+
+log = event_log.get_logger("supervisor")
+
+# Channels are sharded across worker processes that fetch, decode and classify. Only messages
+# that classify as signals cross to the owner process, which alone holds the dedupe stores,
+# the position book, the journal and the webhook executor, so entries stay exactly-once.
+# In the owner this state stays empty; in a worker it is set before the bot starts.
+signal_queue: Optional["multiprocessing.Queue"] = None
+# One byte per channel, written by the owner: 1 while that channel's source holds a position
+open_flags = None
+channel_slots: Dict[str, int] = {}
+# Owner side: the newest message id received from each channel, so a restarted shard resumes after it
+resume_ids: Dict[str, int] = {}
+
+def is_worker() -> bool:
+    return signal_queue is not None
+
+def forward(name: str, msg: Dict):
+    signal_queue.put((name, msg))
+
+def has_open_position(name: str) -> bool:
+    return bool(open_flags[channel_slots[name]])
+
+def shard(names: List[str], workers: int) -> List[List[str]]:
+    return [names[index::workers] for index in range(min(workers, len(names)))]
+
+def run_worker(index: int, names: List[str], run_channels: Callable, cursors: Dict[str, int], queue, flags, slots: Dict[str, int]):
+    global signal_queue, open_flags, channel_slots
+    signal_queue, open_flags, channel_slots = queue, flags, slots
+    # A restarted shard continues from where its predecessor got to instead of reseeding from the newest message
+    for name, cursor in cursors.items():
+        discord_scraper.advance_cursor(channel_registry.get_channel(name).channel_id, str(cursor))
+    event_log.process_name = f"shard-{index}"
+    # Only the owner serves metrics on the configured port; workers dump to their own file
+    config.METRICS_PORT = 0
+    latency_metrics.start(f"metrics-shard-{index}")
+    try:
+        asyncio.run(run_channels(names))
+    except KeyboardInterrupt:
+        pass
+
+def publish_position(name: str):
+    open_flags[channel_slots[name]] = 1 if position_tracker.has_any_open_order(name) else 0
+
+def consume_signals(queue, handle_message: Callable):
+    # Per-channel order is kept by one thread per channel, as in the single-process poller
+    executors = {name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"owner-{name}") for name in channel_slots}
+
+    def handle(name: str, msg: Dict):
+        try:
+            handle_message(name, msg)
+            publish_position(name)
+        except Exception as e:
+            log.error("Error handling signal from %s: %s", name, e, exc_info=True)
+
+    while True:
+        name, msg = queue.get()
+        if msg.get("id"):
+            resume_ids[name] = max(resume_ids.get(name, 0), int(msg["id"]))
+        executors[name].submit(handle, name, msg)
+
+def housekeeping():
+    # Expiry used to ride along with every poll; with polling in the workers the owner runs it
+    while True:
+        time.sleep(1.0)
+        try:
+            position_tracker.reset_orders_if_expired()
+            for name in channel_slots:
+                publish_position(name)
+        except Exception as e:
+            log.error("Error in owner housekeeping: %s", e)
+
+# The bot passes its own entry points in, so a bot started as a script is not imported a second time
+async def supervise(workers: int, handle_message: Callable, run_channels: Callable):
+    global open_flags, channel_slots
+    names = list(channel_registry.get_channels())
+    shards = shard(names, workers)
+    if not shards:
+        log.warning("No channels configured, nothing to poll")
+        return
+
+    # Spawned rather than forked: the owner already runs threads
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    channel_slots = {name: slot for slot, name in enumerate(names)}
+    open_flags = context.Array("b", len(names), lock=False)
+    for name in names:
+        publish_position(name)
+    threading.Thread(target=consume_signals, args=(queue, handle_message), name="owner-signals", daemon=True).start()
+    threading.Thread(target=housekeeping, name="owner-housekeeping", daemon=True).start()
+
+    processes: Dict[int, multiprocessing.Process] = {}
+    started_at: Dict[int, float] = {}
+
+    def start(index: int):
+        cursors = {}
+        if index in started_at:
+            # Channels with nothing forwarded yet resume from when the shard first started
+            floor = discord_scraper.snowflake_at(started_at[index])
+            cursors = {name: resume_ids.get(name, floor) for name in shards[index]}
+        else:
+            started_at[index] = time.time()
+        process = context.Process(target=run_worker, args=(index, shards[index], run_channels, cursors, queue, open_flags, channel_slots), name=f"shard-{index}", daemon=True)
+        process.start()
+        processes[index] = process
+
+    for index in range(len(shards)):
+        start(index)
+    log.info("Supervising %s shard process(es): %s", len(shards), "; ".join(", ".join(names) for names in shards))
+
+    try:
+        while True:
+            await asyncio.sleep(1.0)
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    # It resumes after the newest message the owner received from each channel, so messages
+                    # posted while it was down are fetched; whatever it re-sends is dropped by the owner's dedupe
+                    log.error("Shard %s exited with code %s, restarting", index, process.exitcode)
+                    latency_metrics.increment("shard_restarts_total", shard=index)
+                    start(index)
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join(timeout=5)